@@ -0,0 +1,129 @@
+"""
+Stateless JWT authentication.
+
+Access tokens carry the user's `customer_id`, `is_staff` and
+`is_superuser` (see ClaimsTokenObtainPairSerializer), so an authenticated
+request needs neither the User nor the Customer row. The only database
+read left is a revocation check, whether the user still exists, is active
+and still has the claimed flags and customer, which is cached for
+AUTH_USER_STATE_TIMEOUT seconds and dropped whenever the user or its
+customer changes.
+
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from ecommerce_app.replicas import use_replicas
+
+from .revocation import revoked_tokens
+
+CUSTOMER_CLAIM = 'customer_id'
+
+# Cached value of users that don't exist (None is a cache miss)
+_MISSING = 'missing'
+
+
+def _state_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def get_user_state(user_id):
+    """
+    `(is_active, is_staff, is_superuser, customer_id)` of a user, or None
+    if it doesn't exist.
+
+    """
+    key = _state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        # From the primary, caching a replica's "missing" would lock out new users
+        with use_replicas(False):
+            state = User.objects.filter(pk=user_id).values_list('is_active', 'is_staff', 'is_superuser', 'customer__id').first() or _MISSING
+        cache.set(key, state, settings.AUTH_USER_STATE_TIMEOUT)
+    return None if state == _MISSING else tuple(state)
+
+
+def forget_user_state(user_id):
+    cache.delete(_state_key(user_id))
+
+
+class TokenPrincipal(SimpleLazyObject):
+    """
+    The user of a request authenticated from token claims. `id`, `pk`,
+    `customer_id`, `is_staff` and `is_superuser` are read from the token,
+    any other attribute loads the User row on first use (as `request.user`
+    does in Django), so views that need the model still work.
+
+    """
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        user_id = token[api_settings.USER_ID_CLAIM]
+        super().__init__(lambda: User.objects.get(**{api_settings.USER_ID_FIELD: user_id}))
+        self.__dict__['token'] = token
+
+    @property
+    def id(self):
+        return self.token[api_settings.USER_ID_CLAIM]
+
+    pk = id
+
+    @property
+    def customer_id(self):
+        return self.token.get(CUSTOMER_CLAIM)
+
+    @property
+    def is_staff(self):
+        return bool(self.token.get('is_staff'))
+
+    @property
+    def is_superuser(self):
+        return bool(self.token.get('is_superuser'))
+
+    # Answered without loading the user
+    def __bool__(self):
+        return True
+
+    def __eq__(self, other):
+        return self.id == getattr(other, 'id', None)
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that trusts the claims of tokens issued with them
+    and only checks (through the cache) that they haven't been revoked.
+    Tokens issued without the claims are checked against the database as
+    before. Tokens revoked by id are refused either way.
+
+    """
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if revoked_tokens.is_revoked(validated_token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken(_('Token has been revoked'))
+        return validated_token
+
+    def get_user(self, validated_token):
+        if CUSTOMER_CLAIM not in validated_token or api_settings.USER_ID_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        state = get_user_state(validated_token[api_settings.USER_ID_CLAIM])
+        if state is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        is_active, *claims = state
+        if not is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        # Losing the staff flag or the customer profile revokes the tokens carrying them
+        if claims != [validated_token.get('is_staff'), validated_token.get('is_superuser'), validated_token[CUSTOMER_CLAIM]]:
+            raise AuthenticationFailed(_('Token claims are out of date, please log in again'), code='token_not_valid')
+        return TokenPrincipal(validated_token)
@@ -1,3 +1,17 @@
 from django.db import models
 
 # Create your models here.
+
+
+class RevokedToken(models.Model):
+    """
+    A revoked JWT, kept only until the token would have expired anyway.
+    Loaded into memory by auth_app.revocation.revoked_tokens.
+
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
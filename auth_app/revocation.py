@@ -0,0 +1,83 @@
+"""
+Revoked JWTs.
+
+Revoked token ids (`jti`) are written to the RevokedToken table and kept
+in a per process dict, so checking a token on every request is a hash
+lookup. Each process picks up tokens revoked elsewhere by re-reading the
+recently revoked rows at most every TOKEN_REVOCATION_SYNC_INTERVAL
+seconds. Entries are dropped once the token would have expired anyway,
+from memory on sync and from the table whenever a token is revoked.
+
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken
+
+# Rows are re-read this far back, so ones committed late (after rows with a
+# later revoked_at were seen) are still picked up
+SYNC_OVERLAP = timedelta(minutes=5)
+
+
+class RevocationStore:
+    def __init__(self):
+        self._revoked = {}
+        self._lock = threading.Lock()
+        self._synced_at = None
+        self._seen_until = None
+
+    def is_revoked(self, jti):
+        self.sync_if_due()
+        expires = self._revoked.get(jti)
+        return expires is not None and expires > time.time()
+
+    def sync_if_due(self):
+        interval = settings.TOKEN_REVOCATION_SYNC_INTERVAL
+        if self._synced_at is not None and time.monotonic() - self._synced_at < interval:
+            return
+        with self._lock:
+            if self._synced_at is None or time.monotonic() - self._synced_at >= interval:
+                self.sync()
+
+    def sync(self):
+        now = timezone.now()
+        rows = RevokedToken.objects.filter(expires_at__gt=now)
+        if self._seen_until is not None:
+            rows = rows.filter(revoked_at__gte=self._seen_until - SYNC_OVERLAP)
+        revoked = {jti: expires for jti, expires in self._revoked.items() if expires > now.timestamp()}
+        for jti, expires_at in rows.values_list('jti', 'expires_at'):
+            revoked[jti] = expires_at.timestamp()
+        # Swapped in whole, readers never see a half updated dict
+        self._revoked = revoked
+        self._seen_until = now
+        self._synced_at = time.monotonic()
+
+    def revoke(self, token):
+        """
+        Revoke a simplejwt token (access or refresh) in every process, at
+        the latest after their next sync.
+
+        """
+        jti = token[api_settings.JTI_CLAIM]
+        expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            pass
+        RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        self._revoked = {**self._revoked, jti: expires_at.timestamp()}
+
+    def reset(self):
+        with self._lock:
+            self._revoked = {}
+            self._synced_at = self._seen_until = None
+
+
+revoked_tokens = RevocationStore()
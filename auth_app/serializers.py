@@ -1,6 +1,15 @@
 from djoser.serializers import UserCreateSerializer as BaseClassSerializer
 from djoser.serializers import UserSerializer as BaseClassSerializerInfo
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ecommerce_app.models import Customer
+from .authentication import CUSTOMER_CLAIM
+from .revocation import revoked_tokens
+
 class CustomUserCreateSerializer(BaseClassSerializer):
     first_name = serializers.CharField()
     last_name = serializers.CharField()
@@ -10,3 +19,42 @@ class CustomUserCreateSerializer(BaseClassSerializer):
 class CustomUserInfoSerializer(BaseClassSerializerInfo):
     class Meta(BaseClassSerializerInfo.Meta):
         fields = ['username','email','first_name','last_name']
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Issues tokens carrying the claims StatelessJWTAuthentication
+    authenticates from. Access tokens refreshed later copy them.
+
+    """
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[CUSTOMER_CLAIM] = Customer.objects.filter(user_id=user.id).values_list('id', flat=True).first()
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        return token
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refuses refresh tokens that have been revoked.
+
+    """
+    def validate(self, attrs):
+        if revoked_tokens.is_revoked(self.token_class(attrs['refresh']).get(api_settings.JTI_CLAIM)):
+            raise InvalidToken('Token has been revoked')
+        return super().validate(attrs)
+
+
+class RevokeTokenSerializer(serializers.Serializer):
+    refresh = serializers.CharField(required=False)
+
+    def validate_refresh(self, value):
+        try:
+            token = RefreshToken(value)
+        except TokenError as e:
+            raise serializers.ValidationError(e.args[0])
+        if token.get(api_settings.USER_ID_CLAIM) != self.context['request'].user.id:
+            raise serializers.ValidationError('Token belongs to another user.')
+        return token
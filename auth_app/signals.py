@@ -0,0 +1,23 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ecommerce_app.models import Customer
+from .authentication import forget_user_state
+
+
+# Signals for dropping the cached revocation state of a user once the user or
+# its customer profile is written. Again after commit, like the product cache
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    forget_user_state(instance.pk)
+    transaction.on_commit(lambda: forget_user_state(instance.pk))
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def forget_customer_user(sender, instance, **kwargs):
+    forget_user_state(instance.user_id)
+    transaction.on_commit(lambda: forget_user_state(instance.user_id))
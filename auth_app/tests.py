@@ -1,3 +1,138 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from ecommerce_app.models import Customer, Order, Product, Review
+from .models import RevokedToken
+from .revocation import revoked_tokens
+
+
+class StatelessJWTAuthenticationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='buyer123', email='buyer@example.com')
+        self.customer = Customer.objects.get(user=self.user)
+        Order.objects.create(customer=self.customer)
+        self.client = APIClient()
+
+    def login(self, username='buyer', password='buyer123'):
+        response = self.client.post('/auth/jwt/create/', {'username': username, 'password': password})
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response.data
+
+    def test_tokens_carry_claims(self):
+        tokens = self.login()
+        access = AccessToken(tokens['access'])
+        self.assertEqual(access['customer_id'], self.customer.id)
+        self.assertIs(access['is_staff'], False)
+
+        response = self.client.post('/auth/jwt/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(AccessToken(response.data['access'])['customer_id'], self.customer.id)
+
+    def test_requests_skip_user_and_customer_lookups(self):
+        self.login()
+        self.assertEqual(self.client.get('/shop/orders/').status_code, 200)
+
+        # The revocation state is cached by the first request
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/shop/orders/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        tables = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('"auth_user"', tables)
+        self.assertNotIn('"ecommerce_app_customer"', tables)
+
+    def test_review_uses_claimed_customer(self):
+        product = Product.objects.create(title='Product', unit_price='9.99', inventory=1)
+        self.login()
+        response = self.client.post(f'/shop/products/{product.id}/reviews/', {'description': 'Good'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Review.objects.get().customer, self.customer)
+
+    def test_model_attributes_load_the_user(self):
+        self.login()
+        response = self.client.get('/auth/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], 'buyer@example.com')
+
+    def test_deactivated_user_is_rejected(self):
+        self.login()
+        self.assertEqual(self.client.get('/shop/orders/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/shop/orders/').status_code, 401)
+
+    def test_changed_claims_revoke_the_token(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.login()
+        self.assertEqual(self.client.get('/shop/orders/').status_code, 200)
+
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.get('/shop/orders/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'token_not_valid')
+
+    def test_tokens_without_claims_are_checked_against_the_database(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(self.client.get('/shop/orders/').status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/shop/orders/').status_code, 401)
+
+
+class TokenRevocationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        revoked_tokens.reset()
+        self.user = User.objects.create_user(username='buyer', password='buyer123')
+        self.client = APIClient()
+        self.tokens = self.client.post('/auth/jwt/create/', {'username': 'buyer', 'password': 'buyer123'}).data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+
+    def test_revoke_endpoint(self):
+        self.assertEqual(self.client.get('/shop/orders/').status_code, 200)
+        response = self.client.post('/auth/jwt/revoke/', {'refresh': self.tokens['refresh']})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+
+        self.assertEqual(self.client.get('/shop/orders/').status_code, 401)
+        self.client.credentials()
+        self.assertEqual(self.client.post('/auth/jwt/refresh/', {'refresh': self.tokens['refresh']}).status_code, 401)
+
+    def test_cannot_revoke_tokens_of_other_users(self):
+        other = User.objects.create_user(username='other', password='other123')
+        refresh = str(RefreshToken.for_user(other))
+        self.assertEqual(self.client.post('/auth/jwt/revoke/', {'refresh': refresh}).status_code, 400)
+
+    def test_checks_are_served_from_memory(self):
+        jti = AccessToken(self.tokens['access'])['jti']
+        revoked_tokens.sync()
+        with self.assertNumQueries(0):
+            self.assertFalse(revoked_tokens.is_revoked(jti))
+
+    def test_revocations_of_other_processes_are_synced(self):
+        access = AccessToken(self.tokens['access'])
+        revoked_tokens.sync()
+        # Written by another process
+        RevokedToken.objects.create(jti=access['jti'], expires_at=timezone.now() + timedelta(days=1))
+        self.assertEqual(self.client.get('/shop/orders/').status_code, 200)
+        with override_settings(TOKEN_REVOCATION_SYNC_INTERVAL=0):
+            self.assertEqual(self.client.get('/shop/orders/').status_code, 401)
+
+    def test_expired_entries_are_dropped(self):
+        RevokedToken.objects.create(jti='expired', expires_at=timezone.now() - timedelta(seconds=1))
+        revoked_tokens.sync()
+        self.assertFalse(revoked_tokens.is_revoked('expired'))
+        self.assertNotIn('expired', revoked_tokens._revoked)
+
+        revoked_tokens.revoke(AccessToken(self.tokens['access']))
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), [AccessToken(self.tokens['access'])['jti']])
@@ -1,5 +1,6 @@
 from django.urls import path
 from . import views
 urlpatterns = [
-    path('', views.index, name='index')
-]
\ No newline at end of file
+    path('', views.index, name='index'),
+    path('auth/jwt/revoke/', views.RevokeTokenView.as_view(), name='jwt-revoke'),
+]
@@ -1,4 +1,29 @@
 from django.shortcuts import render
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .revocation import revoked_tokens
+from .serializers import RevokeTokenSerializer
 
 def index(request):
-    return render(request, 'auth_app/index.html')
\ No newline at end of file
+    return render(request, 'auth_app/index.html')
+
+
+class RevokeTokenView(APIView):
+    """
+    Log out: revokes the access token of the request and, when given,
+    the user's `refresh` token.
+
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = RevokeTokenSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        if request.auth is not None:
+            revoked_tokens.revoke(request.auth)
+        if 'refresh' in serializer.validated_data:
+            revoked_tokens.revoke(serializer.validated_data['refresh'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
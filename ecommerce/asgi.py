@@ -12,5 +12,77 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')
+# Catalog, cart and review reads use the async views, e.g. under
+# uvicorn ecommerce.asgi:application --workers 4
+os.environ.setdefault('ASYNC_READ_VIEWS', 'true')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+from django.core.exceptions import MiddlewareNotUsed  # noqa: E402
+from django.core.handlers.asgi import ASGIHandler  # noqa: E402
+from django.core.handlers.exception import convert_exception_to_response  # noqa: E402
+from django.urls import Resolver404, resolve  # noqa: E402
+from django.utils.module_loading import import_string  # noqa: E402
+
+from ecommerce_app.async_urls import urlpatterns as async_urlpatterns  # noqa: E402
+
+# The async read views, wherever the URLconf mounts them
+ASYNC_READ_VIEWS = {pattern.callback for pattern in async_urlpatterns}
+
+
+class ReadHandler(ASGIHandler):
+    """
+    Handler for GET requests to the async read views, running only the
+    middleware listed in ASYNC_READ_MIDDLEWARE. Django 4.2 runs every
+    MiddlewareMixin hook in a worker thread under ASGI, and the session,
+    CSRF, message and clickjacking hooks have nothing to do for these
+    public JSON reads.
+
+    """
+    def load_middleware(self, is_async=False):
+        # Same chain building as BaseHandler.load_middleware, from another list
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        handler = convert_exception_to_response(self._get_response_async if is_async else self._get_response)
+        handler_is_async = is_async
+        for middleware_path in reversed(settings.ASYNC_READ_MIDDLEWARE):
+            middleware = import_string(middleware_path)
+            middleware_is_async = getattr(middleware, 'async_capable', False) and (handler_is_async or not getattr(middleware, 'sync_capable', True))
+            adapted_handler = self.adapt_method_mode(middleware_is_async, handler, handler_is_async, name=f'middleware {middleware_path}')
+            try:
+                instance = middleware(adapted_handler)
+            except MiddlewareNotUsed:
+                continue
+
+            if hasattr(instance, 'process_view'):
+                self._view_middleware.insert(0, self.adapt_method_mode(is_async, instance.process_view))
+            if hasattr(instance, 'process_template_response'):
+                self._template_response_middleware.append(self.adapt_method_mode(is_async, instance.process_template_response))
+            if hasattr(instance, 'process_exception'):
+                self._exception_middleware.append(self.adapt_method_mode(False, instance.process_exception))
+
+            handler = convert_exception_to_response(instance)
+            handler_is_async = middleware_is_async
+
+        self._middleware_chain = self.adapt_method_mode(is_async, handler, handler_is_async)
+
+
+read_application = ReadHandler()
+
+
+def is_async_read(scope):
+    if scope['type'] != 'http' or scope['method'] != 'GET':
+        return False
+    try:
+        return resolve(scope['path']).func in ASYNC_READ_VIEWS
+    except Resolver404:
+        return False
+
+
+async def application(scope, receive, send):
+    if is_async_read(scope):
+        return await read_application(scope, receive, send)
+    return await django_application(scope, receive, send)
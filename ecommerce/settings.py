@@ -12,9 +12,15 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 from datetime import timedelta
+import environ
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Deployment specific settings come from the environment, or from a .env file next to manage.py
+env = environ.Env()
+if (BASE_DIR / '.env').exists():
+    environ.Env.read_env(BASE_DIR / '.env')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -23,9 +29,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-1tt@5(&yri19kw90(4b$2b07!zvpd6g1lnl=p55!*jy_ozcj=!'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = env.bool('DEBUG', default=True)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', default=[])
 
 
 # Application definition
@@ -45,12 +51,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ecommerce_app.middleware.PerformanceMiddleware',
+    'ecommerce_app.middleware.NPlusOneMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ecommerce_app.middleware.CustomerMiddleware',
+    'ecommerce_app.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -88,17 +98,55 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'ecommerce.wsgi.application'
 
+# Serve the hot read endpoints with async views (ecommerce_app.async_views), set by asgi.py
+ASYNC_READ_VIEWS = env.bool('ASYNC_READ_VIEWS', default=False)
+
+# The middleware GET requests to the async read views go through under ASGI
+ASYNC_READ_MIDDLEWARE = [
+    'ecommerce_app.middleware.PerformanceMiddleware',
+    'ecommerce_app.middleware.NPlusOneMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'ecommerce_app.middleware.ReplicaRoutingMiddleware',
+]
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
 
+# DATABASE_URL picks the database, e.g. postgres://user:password@db:5432/ecommerce
+# (defaults to the local SQLite file). DATABASE_REPLICA_URLS lists read replicas
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': env.db('DATABASE_URL', default=f'sqlite:///{BASE_DIR / "db.sqlite3"}'),
 }
+for index, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), start=1):
+    # Tests run replicas as aliases of the test primary
+    DATABASES[f'replica{index}'] = {**env.db_url_config(url), 'TEST': {'MIRROR': 'default'}}
+
+for database in DATABASES.values():
+    # Connections are kept open for DB_CONN_MAX_AGE seconds instead of one per request and
+    # checked before reuse. Every worker thread holds at most one, so the pool is bounded
+    # by processes x threads; put PgBouncer in front (DB_PGBOUNCER=true) to cap it globally
+    database['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=60)
+    database['CONN_HEALTH_CHECKS'] = True
+
+    if database['ENGINE'] == 'django.db.backends.postgresql':
+        database['OPTIONS'] = {'connect_timeout': env.int('DB_CONNECT_TIMEOUT', default=5)}
+        # Transaction pooling can't keep server side cursors open between statements
+        database['DISABLE_SERVER_SIDE_CURSORS'] = env.bool('DB_PGBOUNCER', default=False)
+    elif database['ENGINE'] == 'django.db.backends.sqlite3':
+        # WAL journal and BEGIN IMMEDIATE, writers queue for up to SQLITE_BUSY_TIMEOUT seconds
+        database['ENGINE'] = 'ecommerce.db_backends.sqlite3'
+        database['OPTIONS'] = {'timeout': env.int('SQLITE_BUSY_TIMEOUT', default=20)}
+
+# Safe method requests read from the replicas, except for clients that wrote something in
+# the last REPLICA_STICKY_SECONDS, which stay on the primary until the replicas caught up
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=5)
+DATABASE_ROUTERS = ['ecommerce_app.replicas.ReplicaRouter']
+
+SQLITE_JOURNAL_MODE = env('SQLITE_JOURNAL_MODE', default='wal')
 
 
 
@@ -165,14 +213,26 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'auth_app.authentication.StatelessJWTAuthentication',
     ),
 }
 SIMPLE_JWT = {
    'AUTH_HEADER_TYPES': ('Bearer',),
     'ACCESS_TOKEN_LIFETIME': timedelta(days=5),
+    # Tokens carry customer_id and the staff flags so requests don't load the user
+    'TOKEN_OBTAIN_SERIALIZER': 'auth_app.serializers.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'auth_app.serializers.RevocableTokenRefreshSerializer',
 }
 
+# Seconds the revocation state (active, staff flags, customer) of a token's user is cached
+AUTH_USER_STATE_TIMEOUT = 60
+
+# Seconds before tokens revoked by another process are refused by this one
+TOKEN_REVOCATION_SYNC_INTERVAL = env.int('TOKEN_REVOCATION_SYNC_INTERVAL', default=30)
+
+# Seconds a user's Customer is cached between requests (dropped on every Customer write)
+CUSTOMER_CACHE_TIMEOUT = 60
+
 DJOSER = {
 
     'SERIALIZERS':{
@@ -184,4 +244,39 @@ DJOSER = {
         'user_create': ['ecommerce.permissions.IsAnonymousUser'],
         'user_delete': ['rest_framework.permissions.IsAdminUser']
     }
-}
\ No newline at end of file
+}
+
+# Stock added to a cart stays reserved for this long after the cart's last change
+CART_RESERVATION_TTL = timedelta(minutes=30)
+
+
+# CACHE_URL picks the cache, e.g. redis://redis:6379/1. Cache invalidation (catalog
+# pages, replica pins, auth state, customers, search generation) only reaches every
+# worker through a shared cache, the per process default is for development and tests
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://ecommerce'),
+}
+if CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+
+# Product list and detail responses are cached for this many seconds
+PRODUCT_CACHE_ALIAS = 'default'
+PRODUCT_CACHE_TIMEOUT = 300
+
+# Carts left untouched for this long are deleted by the reaper
+CART_IDLE_TTL = timedelta(days=7)
+
+# New carts get time-ordered (version 7) UUIDs, set to 4 for random ones
+CART_ID_VERSION = 7
+
+# Per request timings are sent to clients in a Server-Timing header
+SERVER_TIMING = env.bool('SERVER_TIMING', default=True)
+
+# Addresses allowed to read /metrics, '*' for anyone (e.g. when the port is only reachable by Prometheus)
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=['127.0.0.1', '::1'])
+
+# N+1 query detection per request: 'warn' logs them, 'raise' fails the request, 'off' disables it
+NPLUSONE_DETECTION = env.str('NPLUSONE_DETECTION', default='warn' if DEBUG else 'off')
+
+# How many times the same query shape may run in one request (or test) before it is reported
+NPLUSONE_THRESHOLD = 3
@@ -16,10 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from ecommerce_app.views import metrics
 urlpatterns = [
     path('', include('auth_app.urls')),
     path('admin/', admin.site.urls),
     path('shop/', include('ecommerce_app.urls')),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.jwt')),
+    path('metrics', metrics, name='metrics'),
 ]
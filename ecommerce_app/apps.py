@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate
 
 
 class EcommerceAppConfig(AppConfig):
@@ -7,3 +9,8 @@ class EcommerceAppConfig(AppConfig):
 
     def ready(self):
         import ecommerce_app.signals
+        from . import metrics, nplusone, search
+        post_migrate.connect(search.restore_search_triggers, sender=self)
+        metrics.install()
+        if settings.NPLUSONE_DETECTION != 'off':
+            nplusone.install()
@@ -0,0 +1,11 @@
+from django.urls import re_path
+
+from . import async_views
+
+# Same routes (and names) as the DRF routers in urls.py, matched first when the app runs under ASGI
+urlpatterns = [
+    re_path(r'^products/$', async_views.product_list, name='products-list'),
+    re_path(r'^products/(?P<pk>[^/.]+)/$', async_views.product_detail, name='products-detail'),
+    re_path(r'^products/(?P<product_pk>[^/.]+)/reviews/$', async_views.review_list, name='product-reviews-list'),
+    re_path(r'^carts/(?P<pk>[^/.]+)/$', async_views.cart_detail, name='cart-detail'),
+]
@@ -0,0 +1,105 @@
+"""
+Async versions of the hot read endpoints, served when the app runs under
+ASGI (see ecommerce/asgi.py). They return the same JSON as the DRF
+viewsets and read through the same product cache; every other method on
+these URLs is handed to the regular viewset.
+
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import views
+from .cache import product_cache
+from .filters import FILTER_PARAMS, ProductFilterBackend
+from .models import Product, Review
+from .pagination import ProductPagination, ReviewPagination
+from .serializers import CartSerializer, ProductSerializer, ReviewSerializer
+
+
+def render(data, status=200):
+    # DRF's encoder, so values like Decimal come out exactly as from the viewsets
+    response = JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+    response['Content-Length'] = len(response.content)
+    return response
+
+
+def async_read_view(sync_view):
+    """
+    Serve GET requests with the decorated coroutine and everything else
+    (and searches) with `sync_view`. DRF errors are rendered the way DRF's
+    exception handler renders them.
+
+    """
+    def decorator(handler):
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            # Search goes through the sync search backends
+            if request.method != 'GET' or 'q' in request.GET:
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            try:
+                return await handler(Request(request), *args, **kwargs)
+            except APIException as exc:
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                return render(data, exc.status_code)
+
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+async def get_or_404(queryset, pk):
+    try:
+        obj = await queryset.filter(pk=pk).afirst()
+    except (ValueError, ValidationError):
+        obj = None
+    if obj is None:
+        raise NotFound()
+    return obj
+
+
+@async_read_view(views.ProductViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def product_list(request):
+    async def compute_page():
+        paginator = ProductPagination()
+        queryset = ProductFilterBackend().filter_queryset(request, Product.objects.all(), None)
+        page = await paginator.apaginate_queryset(queryset, request)
+        return paginator.get_paginated_data(ProductSerializer(page, many=True).data)
+
+    data = await product_cache.aget_or_compute(await product_cache.amake_key('list', request.build_absolute_uri()), compute_page)
+
+    # Same facet cache entries as ProductViewSet.list
+    filters = sorted((name, request.query_params[name]) for name in FILTER_PARAMS if name in request.query_params)
+    facets = await product_cache.aget_or_compute(
+        await product_cache.amake_key('facets', filters),
+        lambda: ProductFilterBackend().aget_facets(request, Product.objects.all()),
+    )
+    return render({**data, 'facets': facets})
+
+
+@async_read_view(views.ProductViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}))
+async def product_detail(request, pk):
+    async def compute():
+        return ProductSerializer(await get_or_404(Product.objects.all(), pk)).data
+
+    return render(await product_cache.aget_or_compute(await product_cache.amake_key('detail', request.build_absolute_uri()), compute))
+
+
+@async_read_view(views.CartViewSet.as_view({'get': 'retrieve', 'delete': 'destroy'}))
+async def cart_detail(request, pk):
+    cart = await get_or_404(views.CartViewSet.queryset, pk)
+    return render(CartSerializer(cart).data)
+
+
+@async_read_view(views.ReviewViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def review_list(request, product_pk):
+    paginator = ReviewPagination()
+    # Usernames are rendered from the customer's user, which can't be lazy loaded in async code
+    queryset = Review.objects.filter(product_id=product_pk).select_related('customer__user')
+    page = await paginator.apaginate_queryset(queryset, request)
+    return render(paginator.get_paginated_data(ReviewSerializer(page, many=True).data))
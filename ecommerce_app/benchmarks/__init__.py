@@ -0,0 +1,50 @@
+"""
+Benchmark scenarios run by `python manage.py benchmark <scenario>`.
+
+Each scenario seeds its own data in a throwaway test database and returns a
+JSON serializable report, so results can be diffed between commits.
+
+"""
+import statistics
+import time
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """
+    Latency summary in milliseconds of `samples` given in seconds.
+
+    """
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3) if samples else None,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3) if samples else None,
+        'p95_ms': round(percentile(samples, 95) * 1000, 3) if samples else None,
+        'p99_ms': round(percentile(samples, 99) * 1000, 3) if samples else None,
+    }
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+# Scenario modules register themselves on import
+from . import cart_ids, checkout, journeys, reviews, search, serving  # noqa: E402,F401
@@ -0,0 +1,74 @@
+from uuid import uuid4
+
+from django.core.management.color import no_style
+from django.db import connection
+
+from ..ids import uuid7
+from ..models import Cart
+from . import scenario, timed
+
+BATCH_SIZE = 10000
+
+
+def index_size(model):
+    """
+    Bytes used by the primary key index of `model`, None when the database
+    can't tell.
+
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name LIKE %s", [f'sqlite_autoindex_{table}_%'])
+            except Exception:
+                return None
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT pg_relation_size(indexrelid) FROM pg_index WHERE indrelid = %s::regclass AND indisprimary", [table]
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def empty_table(model):
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sql_flush(no_style(), [model._meta.db_table]):
+            cursor.execute(sql)
+        # Start the next run from an unfragmented file
+        if connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
+
+
+def insert_carts(size, make_id):
+    samples = []
+    for start in range(0, size, BATCH_SIZE):
+        carts = [Cart(id=make_id()) for _ in range(min(BATCH_SIZE, size - start))]
+        samples.append(timed(Cart.objects.bulk_create, carts)[0])
+    return samples
+
+
+@scenario('cart_ids')
+def run(options):
+    """
+    Insert `--size` carts with random (uuid4) and with time-ordered (uuid7)
+    primary keys and compare insert throughput, the time of the first and
+    last insert batch and the size of the primary key index.
+
+    """
+    report = {'size': options['size'], 'batch_size': BATCH_SIZE, 'vendor': connection.vendor, 'ids': {}}
+    for name, make_id in (('uuid4', uuid4), ('uuid7', uuid7)):
+        empty_table(Cart)
+        samples = insert_carts(options['size'], make_id)
+        seconds = sum(samples)
+        report['ids'][name] = {
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(options['size'] / seconds) if seconds else None,
+            'first_batch_s': round(samples[0], 4) if samples else None,
+            'last_batch_s': round(samples[-1], 4) if samples else None,
+            'index_bytes': index_size(Cart),
+        }
+    empty_table(Cart)
+    return report
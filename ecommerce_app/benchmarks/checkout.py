@@ -0,0 +1,95 @@
+import random
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from rest_framework.test import APIClient
+
+from ..models import Product
+from . import scenario, summarize
+
+ITEMS_PER_CART = 3
+
+
+def checkout(client, product_ids, rng):
+    """
+    One buyer journey through the API: create a cart, fill it with one batch
+    request and place the order. Returns the status code of the failing step,
+    or of the order.
+
+    """
+    response = client.post('/shop/carts/', {}, format='json')
+    if response.status_code != 201:
+        return response.status_code
+    cart_id = response.data['id']
+
+    operations = [{'product_id': product_id, 'quantity': rng.randint(1, 3)} for product_id in rng.sample(product_ids, ITEMS_PER_CART)]
+    response = client.post(f'/shop/carts/{cart_id}/items/batch/', {'operations': operations}, format='json')
+    if response.status_code != 200:
+        return response.status_code
+
+    return client.post('/shop/orders/', {'cart_id': cart_id}, format='json').status_code
+
+
+@scenario('checkout')
+def run(options):
+    """
+    `--concurrency` clients (threads with their own database connection)
+    run `--iterations` checkouts in total against a catalog of `--size`
+    products, through the full middleware and URL stack.
+
+    """
+    rng = random.Random(options['seed'])
+    Product.objects.bulk_create([
+        Product(title=f'Product {number}', unit_price=rng.randint(100, 9999) / 100 + 1, inventory=1_000_000)
+        for number in range(options['size'])
+    ], batch_size=5000)
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    users = [User.objects.create_user(username=f'buyer{number}') for number in range(options['concurrency'])]
+
+    per_client = max(1, options['iterations'] // options['concurrency'])
+    samples, statuses = [], Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(options['concurrency'] + 1)
+
+    def client_thread(user, seed):
+        client = APIClient()
+        client.force_authenticate(user)
+        thread_rng = random.Random(seed)
+        barrier.wait()
+        try:
+            for _ in range(per_client):
+                start = time.perf_counter()
+                try:
+                    status = checkout(client, product_ids, thread_rng)
+                except Exception as e:
+                    status = type(e).__name__
+                elapsed = time.perf_counter() - start
+                with lock:
+                    statuses[status] += 1
+                    if status == 200:
+                        samples.append(elapsed)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=client_thread, args=(user, rng.random())) for user in users]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    return {
+        'size': options['size'],
+        'concurrency': options['concurrency'],
+        'vendor': connection.vendor,
+        'database': {key: connection.settings_dict.get(key) for key in ('ENGINE', 'CONN_MAX_AGE', 'OPTIONS')},
+        'seconds': round(seconds, 3),
+        'checkouts_per_second': round(len(samples) / seconds, 1),
+        'statuses': {str(status): count for status, count in statuses.items()},
+        'latency': summarize(samples),
+    }
@@ -0,0 +1,175 @@
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from rest_framework.test import APIClient
+
+from ..models import Customer, Order, OrderItem, Product, Review
+from ..review_stats import rebuild_review_stats
+from . import scenario, summarize
+
+# Seeded volumes relative to --size products (100k products -> 1M reviews, 100k orders)
+REVIEWS_PER_PRODUCT = 10
+ORDERS_PER_PRODUCT = 1
+ITEMS_PER_ORDER = 2
+ITEMS_PER_CART = 2
+BATCH_SIZE = 5000
+
+
+def bulk_insert(model, objects):
+    objects = iter(objects)
+    while batch := list(islice(objects, BATCH_SIZE)):
+        model.objects.bulk_create(batch)
+
+
+def seed(size, customers, rng):
+    bulk_insert(Product, (
+        Product(title=f'Product {number}', description='Seeded for the journeys benchmark',
+                unit_price=rng.randint(100, 9999) / 100 + 1, inventory=1_000_000)
+        for number in range(size)
+    ))
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+
+    bulk_insert(User, (User(username=f'shopper{number}') for number in range(customers)))
+    bulk_insert(Customer, (Customer(user_id=user_id) for user_id in User.objects.filter(customer__isnull=True).values_list('id', flat=True)))
+    customer_ids = list(Customer.objects.order_by('id').values_list('id', flat=True))
+
+    bulk_insert(Review, (
+        Review(product_id=product_id, customer_id=customer_id, description='Seeded review')
+        for product_id in product_ids for customer_id in rng.sample(customer_ids, min(REVIEWS_PER_PRODUCT, len(customer_ids)))
+    ))
+    # bulk_create skips the signals keeping the counts
+    rebuild_review_stats(batch_size=BATCH_SIZE)
+
+    orders = size * ORDERS_PER_PRODUCT
+    for start in range(0, orders, BATCH_SIZE):
+        batch = Order.objects.bulk_create([Order(customer_id=rng.choice(customer_ids)) for _ in range(min(BATCH_SIZE, orders - start))])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, quantity=rng.randint(1, 3), unit_price=5)
+            for order in batch for product_id in rng.sample(product_ids, ITEMS_PER_ORDER)
+        ])
+    return product_ids, customer_ids
+
+
+class JourneyStopped(Exception):
+    pass
+
+
+def journey(client, product_ids, rng, record):
+    """
+    One shopper: browse the catalog, open a product and its reviews, fill
+    a cart item by item, check out and look at the order history. Stops at
+    the first failing step.
+
+    """
+    def request(endpoint, method, path, data=None):
+        start = time.perf_counter()
+        try:
+            response = getattr(client, method)(path, data, format='json')
+        except Exception as e:
+            record(endpoint, type(e).__name__, time.perf_counter() - start)
+            raise
+        record(endpoint, response.status_code, time.perf_counter() - start)
+        if response.status_code >= 400:
+            raise JourneyStopped
+        return response
+
+    try:
+        page = request('GET /shop/products/', 'get', f"/shop/products/?ordering={rng.choice(['recent', 'price'])}&page_size=20")
+        product_id = rng.choice([product['id'] for product in page.data['results']] or product_ids)
+        request('GET /shop/products/{id}/', 'get', f'/shop/products/{product_id}/')
+        request('GET /shop/products/{id}/reviews/', 'get', f'/shop/products/{product_id}/reviews/')
+
+        cart_id = request('POST /shop/carts/', 'post', '/shop/carts/', {}).data['id']
+        for product_id in rng.sample(product_ids, ITEMS_PER_CART):
+            request('POST /shop/carts/{id}/items/', 'post', f'/shop/carts/{cart_id}/items/', {'product_id': product_id, 'quantity': rng.randint(1, 3)})
+        request('GET /shop/carts/{id}/', 'get', f'/shop/carts/{cart_id}/')
+        request('POST /shop/orders/', 'post', '/shop/orders/', {'cart_id': cart_id})
+        request('GET /shop/orders/', 'get', '/shop/orders/')
+    except JourneyStopped:
+        return False
+    return True
+
+
+@scenario('journeys')
+def run(options):
+    """
+    `--concurrency` shoppers (threads with their own database connection)
+    run `--iterations` journeys in total (browse, add to cart, check out,
+    view orders) through the real URLconf and middleware, against `--size`
+    products with REVIEWS_PER_PRODUCT reviews and ORDERS_PER_PRODUCT past
+    orders each. Reports throughput and latency percentiles per endpoint.
+    On SQLite the command switches to --on-disk, in-memory databases lock
+    whole tables.
+
+    """
+    rng = random.Random(options['seed'])
+    customers = max(REVIEWS_PER_PRODUCT, options['size'] // 100, options['concurrency'])
+    start = time.perf_counter()
+    product_ids, customer_ids = seed(options['size'], customers, rng)
+    data = {
+        'products': len(product_ids),
+        'customers': len(customer_ids),
+        'reviews': Review.objects.count(),
+        'orders': Order.objects.count(),
+        'seed_seconds': round(time.perf_counter() - start, 1),
+    }
+    # Shoppers are customers with order history
+    users = list(User.objects.filter(customer__id__in=customer_ids[:options['concurrency']]))
+
+    per_client = max(1, options['iterations'] // options['concurrency'])
+    samples, statuses, completed = defaultdict(list), defaultdict(Counter), Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(options['concurrency'] + 1)
+
+    def record(endpoint, status, elapsed):
+        with lock:
+            statuses[endpoint][status] += 1
+            if status in range(200, 400):
+                samples[endpoint].append(elapsed)
+
+    def shopper(user, seed):
+        client = APIClient()
+        client.force_authenticate(user)
+        thread_rng = random.Random(seed)
+        barrier.wait()
+        try:
+            for _ in range(per_client):
+                try:
+                    outcome = 'completed' if journey(client, product_ids, thread_rng, record) else 'stopped'
+                except Exception as e:
+                    outcome = type(e).__name__
+                with lock:
+                    completed[outcome] += 1
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=shopper, args=(user, rng.random())) for user in users]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    requests = sum(sum(counts.values()) for counts in statuses.values())
+    return {
+        'size': options['size'],
+        'concurrency': options['concurrency'],
+        'vendor': connection.vendor,
+        'data': data,
+        'seconds': round(seconds, 3),
+        'journeys': dict(completed),
+        'journeys_per_second': round(completed['completed'] / seconds, 1),
+        'requests_per_second': round(requests / seconds, 1),
+        'latency': summarize([sample for endpoint_samples in samples.values() for sample in endpoint_samples]),
+        'endpoints': {
+            endpoint: {**summarize(samples[endpoint]), 'statuses': {str(status): count for status, count in statuses[endpoint].items()}}
+            for endpoint in sorted(statuses)
+        },
+    }
@@ -0,0 +1,97 @@
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import Customer, Product, Review
+from ..pagination import ReviewPagination
+from ..review_stats import rebuild_review_stats
+from . import scenario, summarize
+
+BATCH_SIZE = 5000
+REVIEWS_PER_DAY = 50
+
+
+def bulk_insert(model, objects):
+    objects = iter(objects)
+    while batch := list(islice(objects, BATCH_SIZE)):
+        model.objects.bulk_create(batch)
+
+
+def seed(size):
+    product = Product.objects.create(title='Popular product', unit_price=10, inventory=100)
+    # A customer can only review a product once, so every review has its own reviewer
+    bulk_insert(User, (User(username=f'reviewer{number}') for number in range(size)))
+    bulk_insert(Customer, (Customer(user_id=user_id) for user_id in User.objects.filter(customer__isnull=True).values_list('id', flat=True)))
+    bulk_insert(Review, (
+        Review(product=product, customer_id=customer_id, description='Seeded review')
+        for customer_id in Customer.objects.values_list('id', flat=True).iterator()
+    ))
+    # Spread over the past days, oldest first (`date` is set on insert)
+    review_ids = list(Review.objects.filter(product=product).order_by('id').values_list('id', flat=True))
+    today = timezone.now().date()
+    days = (len(review_ids) - 1) // REVIEWS_PER_DAY
+    for day, start in enumerate(range(0, len(review_ids), REVIEWS_PER_DAY)):
+        Review.objects.filter(id__in=review_ids[start:start + REVIEWS_PER_DAY]).update(date=today - timedelta(days=days - day))
+    rebuild_review_stats()
+    return product
+
+
+def fetch(client, path):
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = client.get(path)
+        elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.status_code
+    return response, elapsed, len(queries)
+
+
+@scenario('reviews')
+def run(options):
+    """
+    Review listing of one product with `--size` reviews (each by a
+    different customer, REVIEWS_PER_DAY a day): the first page
+    `--iterations` times, then every page of the full listing at the
+    largest page size by following the cursors. Keyset pages cost the
+    same at any depth and the usernames come with the page, so latency and
+    queries per request shouldn't grow with either the depth or the page
+    size.
+
+    """
+    start = time.perf_counter()
+    product = seed(options['size'])
+    seed_seconds = round(time.perf_counter() - start, 1)
+    client = APIClient()
+    path = f'/shop/products/{product.pk}/reviews/'
+
+    report = {'size': options['size'], 'vendor': connection.vendor, 'seed_seconds': seed_seconds}
+    for page_size in (ReviewPagination.page_size, ReviewPagination.max_page_size):
+        samples, queries = [], set()
+        for _ in range(options['iterations']):
+            _, elapsed, count = fetch(client, f'{path}?page_size={page_size}')
+            samples.append(elapsed)
+            queries.add(count)
+        report[f'first_page_{page_size}'] = {**summarize(samples), 'queries': sorted(queries)}
+
+    samples, queries, reviews = [], set(), 0
+    url = f'{path}?page_size={ReviewPagination.max_page_size}'
+    while url:
+        response, elapsed, count = fetch(client, url)
+        samples.append(elapsed)
+        queries.add(count)
+        reviews += len(response.data['results'])
+        url = response.data['next']
+    # The deepest pages show whether the cost grows with the cursor position
+    report['full_walk'] = {
+        **summarize(samples),
+        'reviews': reviews,
+        'queries': sorted(queries),
+        'first_pages_mean_ms': round(sum(samples[:10]) / len(samples[:10]) * 1000, 3),
+        'last_pages_mean_ms': round(sum(samples[-10:]) / len(samples[-10:]) * 1000, 3),
+    }
+    return report
@@ -0,0 +1,55 @@
+import random
+
+from ..models import Product
+from ..search import InvertedIndex, get_search_backend
+from . import scenario, summarize, timed
+
+
+def make_vocabulary(size, rng):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return sorted({''.join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)})
+
+
+def seed_products(size, rng, vocabulary, batch_size=5000):
+    # Zipf-like word choice, like real catalogs where a few words are everywhere
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    for start in range(0, size, batch_size):
+        Product.objects.bulk_create([
+            Product(
+                title=f"{' '.join(rng.choices(vocabulary, weights, k=rng.randint(2, 5)))} {number}",
+                description=' '.join(rng.choices(vocabulary, weights, k=rng.randint(8, 20))),
+                unit_price=rng.randint(1, 9999) / 100 + 1,
+                inventory=rng.randint(0, 100),
+            )
+            for number in range(start, min(start + batch_size, size))
+        ])
+
+
+@scenario('search')
+def run(options):
+    """
+    Product search latency over a catalog of `--size` products, for typical
+    one and two word queries and for the worst case of the most common words,
+    which match a large part of the catalog and all have to be ranked.
+
+    """
+    rng = random.Random(options['seed'])
+    vocabulary = make_vocabulary(5000, rng)
+    seed_products(options['size'], rng, vocabulary)
+
+    # Vocabulary is in frequency order, see seed_products
+    query_sets = {
+        'typical': [' '.join(rng.sample(vocabulary, rng.randint(1, 2))) for _ in range(options['iterations'])],
+        'common_words': [' '.join(rng.sample(vocabulary[:50], rng.randint(1, 2))) for _ in range(options['iterations'])],
+    }
+    backends = {'default': get_search_backend()}
+    if options['python_index']:
+        backends['python'] = InvertedIndex()
+
+    report = {'size': options['size'], 'backends': {}}
+    for name, backend in backends.items():
+        build_time, _ = timed(backend.search, 'warmup')
+        report['backends'][name] = {'backend': type(backend).__name__, 'first_query_s': round(build_time, 3)}
+        for query_set, queries in query_sets.items():
+            report['backends'][name][query_set] = summarize([timed(backend.search, query)[0] for query in queries])
+    return report
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+
+from ..models import Cart, CartItem, Customer, Product, Review
+from ..review_stats import rebuild_review_stats
+from . import scenario, summarize
+
+HOST = '127.0.0.1'
+
+# How the traffic splits between the hot read endpoints
+PATH_MIX = [('product_list', 40), ('product_detail', 30), ('cart_detail', 20), ('review_list', 10)]
+
+
+def server_commands(workers, port):
+    return {
+        'wsgi': [
+            sys.executable, '-m', 'gunicorn', 'ecommerce.wsgi:application', '--workers', str(workers),
+            '--worker-class', 'gthread', '--threads', '8', '--bind', f'{HOST}:{port}', '--log-level', 'warning',
+        ],
+        'asgi': [
+            sys.executable, '-m', 'uvicorn', 'ecommerce.asgi:application', '--workers', str(workers),
+            '--host', HOST, '--port', str(port), '--log-level', 'warning', '--no-access-log',
+        ],
+    }
+
+
+def database_url():
+    settings_dict = connection.settings_dict
+    if connection.vendor == 'sqlite':
+        if connection.is_in_memory_db():
+            raise RuntimeError('Servers need a database file, run with --on-disk')
+        return f"sqlite:///{settings_dict['NAME']}"
+    scheme = {'postgresql': 'postgres', 'mysql': 'mysql'}[connection.vendor]
+    return f"{scheme}://{settings_dict['USER']}:{settings_dict['PASSWORD']}@{settings_dict['HOST']}:{settings_dict['PORT'] or ''}/{settings_dict['NAME']}"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with code {process.returncode}')
+        try:
+            socket.create_connection((HOST, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server did not listen on port {port}')
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {name.lower(): value.strip() for name, _, value in (line.partition(':') for line in lines[1:] if line)}
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).strip(), 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    return status, headers.get('connection') == 'close'
+
+
+async def load(port, requests, concurrency):
+    """
+    Send `requests` ([(endpoint, path)]) over `concurrency` keep-alive
+    connections and return the latencies (seconds) of the successful
+    requests by endpoint, the status counts and the wall time.
+
+    """
+    queue = iter(requests)
+    samples, statuses = defaultdict(list), Counter()
+
+    async def client():
+        reader = writer = None
+        for endpoint, path in queue:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(HOST, port)
+            start = time.perf_counter()
+            try:
+                writer.write(f'GET {path} HTTP/1.1\r\nHost: {HOST}\r\n\r\n'.encode('ascii'))
+                status, close = await read_response(reader)
+            except (OSError, asyncio.IncompleteReadError):
+                statuses['connection_error'] += 1
+                writer.close()
+                writer = None
+                continue
+            elapsed = time.perf_counter() - start
+            statuses[status] += 1
+            if status == 200:
+                samples[endpoint].append(elapsed)
+            if close:
+                writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return samples, statuses, time.perf_counter() - start
+
+
+def seed(size, rng):
+    Product.objects.bulk_create([
+        Product(title=f'Product {number}', description='Seeded for the serving benchmark',
+                unit_price=rng.randint(100, 9999) / 100 + 1, inventory=rng.randint(0, 100))
+        for number in range(size)
+    ], batch_size=5000)
+    product_ids = list(Product.objects.values_list('id', flat=True))
+
+    User.objects.bulk_create([User(username=f'reviewer{number}') for number in range(100)])
+    Customer.objects.bulk_create([Customer(user=user) for user in User.objects.filter(customer__isnull=True)])
+    customer_ids = list(Customer.objects.values_list('id', flat=True))
+    reviewed = product_ids[:max(1, size // 10)]
+    Review.objects.bulk_create([
+        Review(product_id=product_id, customer_id=customer_id, description='Seeded review')
+        for product_id in reviewed for customer_id in rng.sample(customer_ids, 5)
+    ], batch_size=5000)
+    # bulk_create skips the signals keeping the counts
+    rebuild_review_stats(batch_size=5000)
+
+    carts = Cart.objects.bulk_create([Cart() for _ in range(1000)])
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product_id=product_id, quantity=rng.randint(1, 3))
+        for cart in carts for product_id in rng.sample(product_ids, 3)
+    ], batch_size=5000)
+    return product_ids, reviewed, [cart.pk for cart in carts]
+
+
+@scenario('serving')
+def run(options):
+    """
+    Requests/s and latency of the hot read endpoints served by gunicorn
+    (WSGI, DRF viewsets) and uvicorn (ASGI, async views) with `--workers`
+    processes each, under `--concurrency` keep-alive clients sending
+    `--iterations` requests. Needs a database the servers can open, so use
+    --on-disk with SQLite.
+
+    """
+    rng = random.Random(options['seed'])
+    product_ids, reviewed, cart_ids = seed(options['size'], rng)
+    paths = {
+        'product_list': lambda: f"/shop/products/?page_size={rng.choice([10, 20])}&ordering={rng.choice(['recent', 'price'])}",
+        'product_detail': lambda: f'/shop/products/{rng.choice(product_ids)}/',
+        'cart_detail': lambda: f'/shop/carts/{rng.choice(cart_ids)}/',
+        'review_list': lambda: f'/shop/products/{rng.choice(reviewed)}/reviews/',
+    }
+    names, weights = zip(*PATH_MIX)
+    requests = [(name, paths[name]()) for name in rng.choices(names, weights, k=options['iterations'])]
+
+    env = {
+        **os.environ,
+        'DATABASE_URL': database_url(),
+        'DEBUG': 'false',
+        'ALLOWED_HOSTS': HOST,
+    }
+    report = {
+        'size': options['size'],
+        'workers': options['workers'],
+        'concurrency': options['concurrency'],
+        'requests': options['iterations'],
+        'mix': dict(PATH_MIX),
+        'servers': {},
+    }
+    port = free_port()
+    for name, command in server_commands(options['workers'], port).items():
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        try:
+            wait_for_port(port, process)
+            # Warm up every worker's connections and caches
+            asyncio.run(load(port, requests[:options['concurrency'] * 4], options['concurrency']))
+            samples, statuses, seconds = asyncio.run(load(port, requests, options['concurrency']))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        report['servers'][name] = {
+            'requests_per_second': round(sum(map(len, samples.values())) / seconds, 1),
+            'statuses': {str(status): count for status, count in statuses.items()},
+            'latency': summarize([sample for endpoint_samples in samples.values() for sample in endpoint_samples]),
+            'endpoints': {endpoint: summarize(samples[endpoint]) for endpoint in names},
+        }
+    return report
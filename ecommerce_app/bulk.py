@@ -0,0 +1,183 @@
+import codecs
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .cache import product_cache
+from .models import Product
+from .search import get_search_backend
+from .serializers import ProductImportSerializer
+
+IMPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FIELDS = ['id', 'title', 'description', 'unit_price', 'inventory']
+
+
+def open_text(upload):
+    """
+    The upload as UTF-8 text. The whole file is decoded once in chunks
+    before any row is read, so a file in another encoding is rejected up
+    front instead of failing halfway through an import.
+
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for chunk in upload.chunks():
+            decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise ValidationError({'file': ['The file is not valid UTF-8 text.']})
+    upload.seek(0)
+    return io.TextIOWrapper(upload, encoding='utf-8', newline='')
+
+
+def read_csv(upload):
+    """
+    Return `(row_number, row)` pairs from a CSV upload with a header line.
+    Rows the csv module can't parse are returned as the error message.
+
+    """
+    text = open_text(upload)
+
+    def rows():
+        reader = csv.DictReader(text)
+        row_number = 0
+        while True:
+            row_number += 1
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                row = f'Invalid CSV: {e}.'
+            yield row_number, row
+
+    return rows()
+
+
+def read_ndjson(upload):
+    """
+    Return `(row_number, row)` pairs from a newline delimited JSON upload.
+    Lines that are not a JSON object are returned as the error message.
+
+    """
+    text = open_text(upload)
+
+    def rows():
+        for row_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = 'Invalid JSON.'
+            if not isinstance(row, (dict, str)):
+                row = 'Expected a JSON object.'
+            yield row_number, row
+
+    return rows()
+
+
+def _import_batch(batch, report):
+    serializer = ProductImportSerializer()
+    valid = {}
+    for row_number, row in batch:
+        if isinstance(row, str):
+            report['errors'].append({'row': row_number, 'errors': {'non_field_errors': [row]}})
+            continue
+        try:
+            data = serializer.run_validation(row)
+        except ValidationError as e:
+            report['errors'].append({'row': row_number, 'errors': e.detail})
+            continue
+        # The last row wins when a title appears twice in a batch
+        valid[data['title']] = (row_number, data)
+
+    if not valid:
+        return
+
+    try:
+        with transaction.atomic():
+            existing = Product.objects.in_bulk(list(valid), field_name='title')
+            now = timezone.now()
+            to_create, to_update = [], []
+            for title, (_, data) in valid.items():
+                product = existing.get(title)
+                if product is None:
+                    to_create.append(Product(**data))
+                    continue
+                for field, value in data.items():
+                    setattr(product, field, value)
+                product.last_update = now
+                to_update.append(product)
+
+            Product.objects.bulk_create(to_create, batch_size=IMPORT_BATCH_SIZE)
+            Product.objects.bulk_update(to_update, ['description', 'unit_price', 'inventory', 'last_update'], batch_size=IMPORT_BATCH_SIZE)
+    except IntegrityError:
+        # A concurrent writer created one of the titles, the batch can be retried as a whole
+        report['errors'].extend(
+            {'row': row_number, 'errors': {'non_field_errors': ['Conflicting write, please retry this row.']}}
+            for row_number, _ in valid.values()
+        )
+        return
+
+    report['created'] += len(to_create)
+    report['updated'] += len(to_update)
+
+
+def import_products(rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Upsert products by title from an iterable of `(row_number, row)` pairs.
+
+    Rows are validated and written in batches of `batch_size`, each batch
+    costing one lookup query plus the bulk insert and update. Invalid rows
+    are reported and skipped without aborting the rest of the load.
+
+    """
+    report = {'created': 0, 'updated': 0, 'errors': []}
+    rows = iter(rows)
+    try:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            _import_batch(batch, report)
+    finally:
+        # Bulk writes don't send post_save, so the catalog cache and search index are refreshed here
+        if report['created'] or report['updated']:
+            product_cache.invalidate()
+            get_search_backend().invalidate()
+    return report
+
+
+class _Echo:
+    """
+    File-like object that returns what is written, so csv.writer can
+    format one line at a time.
+
+    """
+    def write(self, value):
+        return value
+
+
+def _export_rows():
+    return Product.objects.order_by('id').values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def export_csv():
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in _export_rows():
+        yield writer.writerow(row)
+
+
+def export_ndjson():
+    for row in _export_rows():
+        product = dict(zip(EXPORT_FIELDS, row))
+        product['unit_price'] = str(product['unit_price'])
+        yield json.dumps(product) + '\n'
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .replicas import use_replicas
+
+
+class ReadThroughCache:
+    """
+    Read-through cache for serialized API responses.
+
+    Values live in one of the Django cache aliases, so any backend with the
+    Django cache API works (locmem and file based out of the box, Redis or
+    memcached in production). All keys embed a generation number and
+    `invalidate()` simply moves to a new generation, which makes entries
+    written by a request that raced with a write unreachable as well.
+
+    Only one caller recomputes a missing key at a time; the others wait for
+    its result instead of all hitting the database (single flight).
+
+    Entries are computed from the primary database. A replica that hasn't
+    caught up with the write behind an invalidation would otherwise put the
+    old rows under the new generation for the whole timeout.
+
+    """
+    lock_timeout = 10
+    poll_interval = 0.05
+
+    def __init__(self, namespace, alias='default', timeout=300):
+        self.namespace = namespace
+        self.alias = alias
+        self.timeout = timeout
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def generation_key(self):
+        return f'{self.namespace}:generation'
+
+    def count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {name: self.stats[name] for name in ('hits', 'misses', 'recomputes', 'waits', 'invalidations')}
+
+    def get_generation(self):
+        generation = self.cache.get(self.generation_key)
+        if generation is None:
+            # A missing (evicted) generation must never bring back old entries,
+            # so a fresh one is derived from the clock
+            self.cache.add(self.generation_key, time.time_ns(), None)
+            generation = self.cache.get(self.generation_key)
+        return generation
+
+    async def aget_generation(self):
+        generation = await self.cache.aget(self.generation_key)
+        if generation is None:
+            await self.cache.aadd(self.generation_key, time.time_ns(), None)
+            generation = await self.cache.aget(self.generation_key)
+        return generation
+
+    def _digest(self, parts):
+        return hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+    def make_key(self, *parts):
+        return f'{self.namespace}:{self.get_generation()}:{self._digest(parts)}'
+
+    async def amake_key(self, *parts):
+        return f'{self.namespace}:{await self.aget_generation()}:{self._digest(parts)}'
+
+    def get_or_compute(self, key, compute):
+        value = self.cache.get(key)
+        if value is not None:
+            self.count('hits')
+            return value
+        self.count('misses')
+
+        lock_key = f'{key}:lock'
+        if self.cache.add(lock_key, 1, self.lock_timeout):
+            try:
+                with use_replicas(False):
+                    value = compute()
+                self.cache.set(key, value, self.timeout)
+                self.count('recomputes')
+                return value
+            finally:
+                self.cache.delete(lock_key)
+
+        # Someone else is recomputing this key, wait for their result
+        self.count('waits')
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = self.cache.get(key)
+            if value is not None:
+                return value
+            if not self.cache.get(lock_key):
+                break
+        with use_replicas(False):
+            return compute()
+
+    async def aget_or_compute(self, key, compute):
+        """
+        get_or_compute for async views, `compute` is a coroutine function.
+        Cache calls go through the async cache API, a Redis or memcached round
+        trip made with the sync one would block the event loop.
+
+        """
+        value = await self.cache.aget(key)
+        if value is not None:
+            self.count('hits')
+            return value
+        self.count('misses')
+
+        lock_key = f'{key}:lock'
+        if await self.cache.aadd(lock_key, 1, self.lock_timeout):
+            try:
+                with use_replicas(False):
+                    value = await compute()
+                await self.cache.aset(key, value, self.timeout)
+                self.count('recomputes')
+                return value
+            finally:
+                await self.cache.adelete(lock_key)
+
+        self.count('waits')
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            value = await self.cache.aget(key)
+            if value is not None:
+                return value
+            if not await self.cache.aget(lock_key):
+                break
+        with use_replicas(False):
+            return await compute()
+
+    def invalidate(self):
+        self.count('invalidations')
+        self.cache.set(self.generation_key, time.time_ns(), None)
+
+
+product_cache = ReadThroughCache(
+    'products',
+    alias=getattr(settings, 'PRODUCT_CACHE_ALIAS', 'default'),
+    timeout=getattr(settings, 'PRODUCT_CACHE_TIMEOUT', 300),
+)
@@ -0,0 +1,61 @@
+"""
+Customer of the current request.
+
+Views resolve the customer of the authenticated user with
+`get_request_customer(request)`, which looks it up at most once per
+request (CustomerMiddleware also offers it as the lazy `request.customer`).
+Lookups go through the Django cache for CUSTOMER_CACHE_TIMEOUT seconds,
+and the entry of a user is dropped whenever its Customer is saved or
+deleted.
+
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Customer
+from .replicas import use_replicas
+
+# Cached value of users without a customer profile (None is a cache miss)
+_MISSING = 'missing'
+
+
+def _cache_key(user_id):
+    return f'customer:user:{user_id}'
+
+
+def get_customer(user):
+    """
+    The Customer of `user`, or None for anonymous users and users without
+    a customer profile.
+
+    """
+    if not user or not user.is_authenticated:
+        return None
+    key = _cache_key(user.id)
+    customer = cache.get(key)
+    if customer is None:
+        # From the primary, a user who just signed up may not be on the replicas yet
+        with use_replicas(False):
+            customer = Customer.objects.filter(user_id=user.id).first() or _MISSING
+        cache.set(key, customer, settings.CUSTOMER_CACHE_TIMEOUT)
+    return None if customer == _MISSING else customer
+
+
+def forget_customer(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def get_request_customer(request):
+    """
+    The Customer of the user authenticated on `request` (a DRF or Django
+    request), resolved once and kept on the request. The result is keyed
+    by user, so a lookup made before DRF authenticated the request isn't
+    reused afterwards.
+
+    """
+    user = request.user
+    http_request = getattr(request, '_request', request)
+    resolved = http_request.__dict__.get('_customer')
+    if resolved is None or resolved[0] != user.id:
+        resolved = http_request._customer = (user.id, get_customer(user))
+    return resolved[1]
@@ -0,0 +1,127 @@
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+# (label, lower bound inclusive, upper bound exclusive)
+PRICE_BUCKETS = [
+    ('0-10', None, 10),
+    ('10-25', 10, 25),
+    ('25-50', 25, 50),
+    ('50-100', 50, 100),
+    ('100+', 100, None),
+]
+
+# Query parameters the facet counts depend on
+FILTER_PARAMS = ['min_price', 'max_price', 'in_stock', 'updated_since']
+
+# Accepted values of ?ordering= and the keyset ordering they map to
+PRODUCT_ORDERINGS = {
+    'recent': ('-last_update', '-id'),
+    'oldest': ('last_update', 'id'),
+    'price': ('unit_price', 'id'),
+    '-price': ('-unit_price', '-id'),
+}
+
+
+def _decimal_param(request, name):
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        number = None
+    if number is None or not number.is_finite():
+        raise ValidationError({name: ['A valid number is required.']})
+    return number
+
+
+def _datetime_param(request, name):
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None and parse_date(value) is not None:
+            parsed = datetime.combine(parse_date(value), time.min)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: ['A valid date or datetime is required.']})
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+class ProductFilterBackend(BaseFilterBackend):
+    """
+    Catalog filters: ?min_price=, ?max_price=, ?in_stock=true and
+    ?updated_since= (ISO date or datetime).
+
+    """
+    def get_price_filter(self, request):
+        condition = Q()
+        min_price = _decimal_param(request, 'min_price')
+        max_price = _decimal_param(request, 'max_price')
+        if min_price is not None:
+            condition &= Q(unit_price__gte=min_price)
+        if max_price is not None:
+            condition &= Q(unit_price__lte=max_price)
+        return condition
+
+    def get_stock_filter(self, request):
+        if request.query_params.get('in_stock', '').lower() in ('1', 'true', 'yes'):
+            return Q(inventory__gt=0)
+        return Q()
+
+    def get_base_filter(self, request):
+        updated_since = _datetime_param(request, 'updated_since')
+        if updated_since is not None:
+            return Q(last_update__gte=updated_since)
+        return Q()
+
+    def filter_queryset(self, request, queryset, view):
+        return queryset.filter(self.get_base_filter(request), self.get_price_filter(request), self.get_stock_filter(request))
+
+    def get_facets(self, request, queryset):
+        """
+        Price bucket and stock counts for the current filters, in one
+        aggregate query. Each facet ignores its own filter (and honours the
+        others) so clients can show how many products every choice leads to.
+
+        """
+        queryset, aggregates = self.get_facet_aggregates(request, queryset)
+        return self.format_facets(queryset.aggregate(**aggregates))
+
+    async def aget_facets(self, request, queryset):
+        queryset, aggregates = self.get_facet_aggregates(request, queryset)
+        return self.format_facets(await queryset.aaggregate(**aggregates))
+
+    def get_facet_aggregates(self, request, queryset):
+        queryset = queryset.filter(self.get_base_filter(request))
+        price_filter = self.get_price_filter(request)
+        stock_filter = self.get_stock_filter(request)
+
+        aggregates = {}
+        for index, (_, low, high) in enumerate(PRICE_BUCKETS):
+            bucket = Q()
+            if low is not None:
+                bucket &= Q(unit_price__gte=low)
+            if high is not None:
+                bucket &= Q(unit_price__lt=high)
+            aggregates[f'price_{index}'] = Count('id', filter=bucket & stock_filter)
+        aggregates['in_stock'] = Count('id', filter=Q(inventory__gt=0) & price_filter)
+        aggregates['out_of_stock'] = Count('id', filter=Q(inventory__lte=0) & price_filter)
+        return queryset, aggregates
+
+    def format_facets(self, counts):
+        return {
+            'price': [
+                {'range': label, 'min': low, 'max': high, 'count': counts[f'price_{index}']}
+                for index, (label, low, high) in enumerate(PRICE_BUCKETS)
+            ],
+            'stock': {'in_stock': counts['in_stock'], 'out_of_stock': counts['out_of_stock']},
+        }
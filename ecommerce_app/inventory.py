@@ -0,0 +1,193 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Product, StockReservation
+
+# How long stock stays reserved for a cart after its last change
+RESERVATION_TTL = getattr(settings, 'CART_RESERVATION_TTL', timedelta(minutes=30))
+
+
+def _release(reservations):
+    """
+    Give the units of `reservations` ([(product_id, quantity)]) back to
+    Product.reserved with one UPDATE.
+
+    """
+    released = defaultdict(int)
+    for product_id, quantity in reservations:
+        released[product_id] += quantity
+    if not released:
+        return
+
+    amount = Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in released.items()],
+        output_field=IntegerField(),
+    )
+    Product.objects.filter(pk__in=released.keys()).update(reserved=F('reserved') - amount)
+
+
+def _take(product_id, quantity):
+    # Atomic check-and-increment on the single product row: no read-modify-write
+    # window, and concurrent buyers of other products are never blocked
+    return Product.objects.filter(pk=product_id, inventory__gte=F('reserved') + quantity).update(
+        reserved=F('reserved') + quantity
+    )
+
+
+def _take_many(quantities):
+    # All or nothing version of _take for {product_id: quantity}, in one UPDATE
+    amount = Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    savepoint = transaction.savepoint()
+    taken = Product.objects.filter(pk__in=quantities.keys(), inventory__gte=F('reserved') + amount).update(
+        reserved=F('reserved') + amount
+    )
+    if taken == len(quantities):
+        transaction.savepoint_commit(savepoint)
+        return True
+    transaction.savepoint_rollback(savepoint)
+    return False
+
+
+def hold_stock(cart_id, product_id, quantity):
+    """
+    Set the reservation of `product_id` for `cart_id` to `quantity` units and
+    push its expiry forward. Raises ValidationError when the extra units are
+    not available.
+
+    """
+    with transaction.atomic():
+        reservation = StockReservation.objects.select_for_update().filter(cart_id=cart_id, product_id=product_id).first()
+        delta = quantity - (reservation.quantity if reservation else 0)
+
+        if delta > 0 and not _take(product_id, delta):
+            # Holds that have run out but were not reaped yet still count as reserved
+            if not release_expired(product_ids=[product_id], exclude_cart_id=cart_id) or not _take(product_id, delta):
+                raise ValidationError('Desired quantity not present in stock')
+        elif delta < 0:
+            _release([(product_id, -delta)])
+
+        if quantity == 0:
+            if reservation:
+                reservation.delete()
+            return None
+
+        expires_at = timezone.now() + RESERVATION_TTL
+        if reservation:
+            reservation.quantity = quantity
+            reservation.expires_at = expires_at
+            reservation.save(update_fields=['quantity', 'expires_at'])
+            return reservation
+        return StockReservation.objects.create(cart_id=cart_id, product_id=product_id, quantity=quantity, expires_at=expires_at)
+
+
+def hold_cart_stock(cart_id, quantities):
+    """
+    Batch version of hold_stock: set the reservations of `cart_id` to
+    `quantities` ({product_id: quantity}, 0 drops the hold) with a fixed
+    number of queries whatever the number of products. Raises
+    ValidationError listing the products whose extra units are not available.
+
+    """
+    with transaction.atomic():
+        reservations = {
+            reservation.product_id: reservation
+            for reservation in StockReservation.objects.select_for_update().filter(cart_id=cart_id, product_id__in=quantities.keys())
+        }
+        deltas = {
+            product_id: quantity - (reservations[product_id].quantity if product_id in reservations else 0)
+            for product_id, quantity in quantities.items()
+        }
+
+        extra = {product_id: delta for product_id, delta in deltas.items() if delta > 0}
+        if extra and not _take_many(extra):
+            # Holds that have run out but were not reaped yet still count as reserved
+            if not release_expired(product_ids=list(extra), exclude_cart_id=cart_id) or not _take_many(extra):
+                stock = Product.objects.filter(pk__in=extra.keys()).values_list('pk', 'inventory', 'reserved')
+                short = sorted(product_id for product_id, inventory, reserved in stock if inventory < reserved + extra[product_id])
+                raise ValidationError({'product_id': [f'Desired quantity of product {product_id} not present in stock' for product_id in short]})
+        _release([(product_id, -delta) for product_id, delta in deltas.items() if delta < 0])
+
+        expires_at = timezone.now() + RESERVATION_TTL
+        dropped, changed, created = [], [], []
+        for product_id, quantity in quantities.items():
+            reservation = reservations.get(product_id)
+            if quantity == 0:
+                if reservation:
+                    dropped.append(reservation.pk)
+            elif reservation:
+                reservation.quantity = quantity
+                reservation.expires_at = expires_at
+                changed.append(reservation)
+            else:
+                created.append(StockReservation(cart_id=cart_id, product_id=product_id, quantity=quantity, expires_at=expires_at))
+
+        if dropped:
+            StockReservation.objects.filter(pk__in=dropped).delete()
+        StockReservation.objects.bulk_update(changed, ['quantity', 'expires_at'])
+        StockReservation.objects.bulk_create(created)
+
+
+def release_carts(cart_ids):
+    """
+    Drop every reservation held by `cart_ids` and return the units to stock.
+
+    """
+    with transaction.atomic():
+        reservations = StockReservation.objects.select_for_update().filter(cart_id__in=cart_ids)
+        rows = list(reservations.values_list('id', 'product_id', 'quantity'))
+        _release([(product_id, quantity) for _, product_id, quantity in rows])
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    return len(rows)
+
+
+def release_expired(product_ids=None, exclude_cart_id=None, batch_size=1000):
+    """
+    Release up to `batch_size` expired reservations and return how many were
+    released. Rows locked by a running checkout are skipped.
+
+    """
+    with transaction.atomic():
+        expired = StockReservation.objects.select_for_update(skip_locked=True).filter(expires_at__lte=timezone.now())
+        if product_ids is not None:
+            expired = expired.filter(product_id__in=product_ids)
+        if exclude_cart_id is not None:
+            expired = expired.exclude(cart_id=exclude_cart_id)
+
+        rows = list(expired.values_list('id', 'product_id', 'quantity')[:batch_size])
+        _release([(product_id, quantity) for _, product_id, quantity in rows])
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    return len(rows)
+
+
+def commit_cart(cart_id, quantities):
+    """
+    Turn the reservations of `cart_id` into an inventory decrement of
+    `quantities` ({product_id: quantity}). Must run inside the checkout
+    transaction. Raises ValidationError when the stock is not there.
+
+    """
+    held = dict(
+        StockReservation.objects.select_for_update().filter(cart_id=cart_id).values_list('product_id', 'quantity')
+    )
+
+    for attempt in range(2):
+        # A short product leaves the other rows decremented, so each try runs in a savepoint
+        savepoint = transaction.savepoint()
+        if Product.decrement_inventory(quantities, held) == len(quantities):
+            transaction.savepoint_commit(savepoint)
+            break
+        transaction.savepoint_rollback(savepoint)
+
+        if attempt or not release_expired(product_ids=list(quantities), exclude_cart_id=cart_id):
+            raise ValidationError({'cart_id': ['Desired quantity not present in stock']})
+
+    StockReservation.objects.filter(cart_id=cart_id).delete()
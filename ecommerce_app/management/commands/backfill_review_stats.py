@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce_app.review_stats import rebuild_review_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the review count of every product, e.g. after adding the column or a bulk review load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products recounted per UPDATE')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        report = rebuild_review_stats(options['batch_size'], options['pause'])
+        self.stdout.write(f"Recounted the reviews of {report['products']} products in {report['batches']} batches ({report['seconds']}s)")
@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from ecommerce_app.benchmarks import SCENARIOS
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Run a benchmark scenario against a throwaway test database and print a JSON report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--size', type=int, default=10000, help='Number of rows to seed')
+        parser.add_argument('--iterations', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--workers', type=int, default=2, help='Server processes for scenarios that start servers')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--python-index', action='store_true', help='Also measure the pure Python search index')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database between runs')
+        parser.add_argument('--on-disk', action='store_true', help='Use a database file instead of in-memory SQLite')
+        parser.add_argument('--output', help='Write the report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and options['concurrency'] > 1 and not options['on_disk']:
+            # Threads sharing the in-memory database fail with "database table is locked"
+            self.stderr.write('Concurrent clients need a database file with SQLite, running with --on-disk')
+            options['on_disk'] = True
+        if options['on_disk'] and connection.vendor == 'sqlite':
+            # Concurrency scenarios need the file locking (and journal mode) of a real database file
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), 'ecommerce_benchmark.sqlite3')
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            # Scenarios drive the app through the test client, without the DEBUG query log or N+1 checks
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], NPLUSONE_DETECTION='off'):
+                report = SCENARIOS[options['scenario']](options)
+        except Exception as e:
+            raise CommandError(f'Benchmark {options["scenario"]} failed: {e}') from e
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        # The revision lets reports of different commits be told apart when diffed
+        report = json.dumps({'scenario': options['scenario'], 'revision': git_revision(), **report}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        else:
+            self.stdout.write(report)
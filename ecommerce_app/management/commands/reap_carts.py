@@ -0,0 +1,32 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from ecommerce_app.inventory import release_expired
+from ecommerce_app.reaper import CART_IDLE_TTL, reap_carts
+
+
+class Command(BaseCommand):
+    help = 'Delete carts that have been idle for longer than the cart TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=float, help='Idle hours before a cart is deleted (defaults to CART_IDLE_TTL)')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--loop', action='store_true', help='Keep running every --interval seconds')
+        parser.add_argument('--interval', type=float, default=300.0)
+
+    def handle(self, *args, **options):
+        ttl = timedelta(hours=options['ttl']) if options['ttl'] is not None else CART_IDLE_TTL
+        while True:
+            report = reap_carts(ttl, options['batch_size'], options['pause'])
+            released = release_expired()
+            self.stdout.write(
+                f"Deleted {report['deleted']} carts in {report['batches']} batches "
+                f"({report['seconds']}s, {report['per_second'] or 0} carts/s), "
+                f"released {released} expired reservations"
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
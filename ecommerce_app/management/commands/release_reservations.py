@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce_app.inventory import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Return the stock of expired cart reservations to the catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            released = release_expired(batch_size=options['batch_size'])
+            total += released
+            if released < options['batch_size']:
+                break
+        self.stdout.write(f'Released {total} expired reservations')
@@ -0,0 +1,174 @@
+"""
+Per-request performance metrics.
+
+PerformanceMiddleware measures every request (wall time, SQL queries and
+the time spent in them, serializer time, response size), reports the
+breakdown in a Server-Timing header and aggregates it per route in this
+process, where the /metrics endpoint renders it in the Prometheus text
+format.
+
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from rest_framework.serializers import BaseSerializer
+
+from .cache import product_cache
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('start', 'queries', 'db_time', 'serialize_time', 'serialize_depth')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serialize_depth = 0
+
+    def server_timing(self, total):
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+            f'serialize;dur={self.serialize_time * 1000:.1f}, '
+            f'total;dur={total * 1000:.1f}'
+        )
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.queries += 1
+
+
+def instrument_connection(sender, connection, **kwargs):
+    # Wrappers outlive reconnections, so each connection object gets one only once
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def instrument_serializers():
+    """
+    Time the `.data` of top level DRF serializers, which is where model
+    instances are turned into primitives (nested serializers run inside it).
+
+    """
+    data = BaseSerializer.data
+    if getattr(data.fget, 'timed', False):
+        return
+
+    def timed_data(self):
+        metrics = _current.get()
+        if metrics is None:
+            return data.fget(self)
+        metrics.serialize_depth += 1
+        start = time.perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            metrics.serialize_depth -= 1
+            if not metrics.serialize_depth:
+                metrics.serialize_time += time.perf_counter() - start
+
+    timed_data.timed = True
+    BaseSerializer.data = property(timed_data)
+
+
+class Registry:
+    """
+    Per route counters and latency histograms of this process.
+
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+            self.totals = defaultdict(lambda: defaultdict(float))
+
+    def observe(self, route, method, status, metrics, duration, size):
+        bucket = bisect_left(LATENCY_BUCKETS, duration)
+        with self._lock:
+            self.requests[(route, method, status)] += 1
+            self.buckets[(route, method)][bucket] += 1
+            totals = self.totals[(route, method)]
+            totals['duration'] += duration
+            totals['db_queries'] += metrics.queries
+            totals['db_seconds'] += metrics.db_time
+            totals['serialize_seconds'] += metrics.serialize_time
+            totals['response_bytes'] += size
+
+    def render(self):
+        with self._lock:
+            requests = dict(self.requests)
+            buckets = {key: list(counts) for key, counts in self.buckets.items()}
+            totals = {key: dict(values) for key, values in self.totals.items()}
+
+        lines = [
+            '# HELP http_requests_total Requests handled, by route, method and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (route, method, status), count in sorted(requests.items()):
+            lines.append(f'http_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            '# HELP http_request_duration_seconds Request latency, by route and method.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (route, method), counts in sorted(buckets.items()):
+            labels = f'route="{route}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {totals[(route, method)]["duration"]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+        for name, help_text in (
+            ('db_queries', 'SQL queries run by requests'),
+            ('db_seconds', 'Time requests spent in SQL queries'),
+            ('serialize_seconds', 'Time requests spent in serializers'),
+            ('response_bytes', 'Response body bytes sent'),
+        ):
+            lines += [f'# HELP http_request_{name}_total {help_text}, by route and method.', f'# TYPE http_request_{name}_total counter']
+            for (route, method), values in sorted(totals.items()):
+                lines.append(f'http_request_{name}_total{{route="{route}",method="{method}"}} {round(values[name], 6)}')
+
+        lines += ['# HELP product_cache_events_total Product cache events.', '# TYPE product_cache_events_total counter']
+        for event, count in product_cache.get_stats().items():
+            lines.append(f'product_cache_events_total{{event="{event}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def install():
+    connection_created.connect(instrument_connection, dispatch_uid='ecommerce_app.metrics')
+    instrument_serializers()
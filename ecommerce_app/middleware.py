@@ -0,0 +1,156 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.functional import SimpleLazyObject
+
+from .customers import get_request_customer
+from .metrics import end_request, registry, start_request
+from .nplusone import end_watch, start_watch
+from .replicas import is_pinned_to_primary, pin_response, pin_to_primary, replica_aliases, use_replicas
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serves safe method requests from the read replicas. Writes run on the
+    primary and pin their client to it for REPLICA_STICKY_SECONDS, so a
+    checkout followed by a look at the order history reads its own writes
+    despite replication lag.
+
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def use_replicas(self, request):
+        if request.method not in SAFE_METHODS:
+            # Pinned before the write commits, so no follow-up read can slip through to a replica
+            pin_to_primary(request)
+            return False
+        return not is_pinned_to_primary(request)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replica_aliases():
+            return self.get_response(request)
+        with use_replicas(self.use_replicas(request)):
+            response = self.get_response(request)
+        return pin_response(response) if request.method not in SAFE_METHODS else response
+
+    async def __acall__(self, request):
+        if not replica_aliases():
+            return await self.get_response(request)
+        with use_replicas(self.use_replicas(request)):
+            response = await self.get_response(request)
+        return pin_response(response) if request.method not in SAFE_METHODS else response
+
+
+class PerformanceMiddleware:
+    """
+    Measures every request and feeds the per route metrics served at
+    /metrics. The breakdown is also sent to the client in a Server-Timing
+    header (SERVER_TIMING setting). Goes first in MIDDLEWARE so the total
+    covers the whole stack.
+
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def finish(self, request, response, metrics):
+        duration = time.perf_counter() - metrics.start
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else 'unmatched'
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(route, request.method, response.status_code, metrics, duration, size)
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = metrics.server_timing(duration)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token = start_request()
+        try:
+            return self.finish(request, self.get_response(request), metrics)
+        finally:
+            end_request(token)
+
+    async def __acall__(self, request):
+        metrics, token = start_request()
+        try:
+            return self.finish(request, await self.get_response(request), metrics)
+        finally:
+            end_request(token)
+
+
+class NPlusOneMiddleware:
+    """
+    Watches each request for N+1 queries and logs them (NPLUSONE_DETECTION
+    = 'warn', the default with DEBUG on) or fails the request ('raise').
+    Removed from the stack when the setting is 'off'.
+
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        mode = getattr(settings, 'NPLUSONE_DETECTION', 'off')
+        if mode not in ('warn', 'raise'):
+            raise MiddlewareNotUsed
+        self.raise_errors = mode == 'raise'
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        watch, token = start_watch()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_watch(watch, token, self.raise_errors)
+        return response
+
+    async def __acall__(self, request):
+        watch, token = start_watch()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_watch(watch, token, self.raise_errors)
+        return response
+
+
+class CustomerMiddleware:
+    """
+    Adds `request.customer`, the Customer of the authenticated user looked
+    up on first use (falsy for anonymous users and users without one).
+    Views get the same object from get_request_customer(), which also
+    works on requests that didn't go through the middleware.
+
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.customer = SimpleLazyObject(lambda: get_request_customer(request))
+        # Under ASGI this returns the coroutine of the next handler, which the caller awaits
+        return self.get_response(request)
@@ -0,0 +1,56 @@
+# Generated by Django 4.2 on 2026-10-18 17:34
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# unique_product_title can't be added while titles are shared, the oldest
+# product keeps its title and the others get their id appended
+def make_titles_unique(apps, schema_editor):
+    Product = apps.get_model('ecommerce_app', 'Product')
+    duplicated = Product.objects.values('title').annotate(count=Count('id')).filter(count__gt=1).values_list('title', flat=True)
+    for title in list(duplicated):
+        for product in Product.objects.filter(title=title).order_by('id')[1:]:
+            attempt = 0
+            while True:
+                suffix = f' ({product.id})' if not attempt else f' ({product.id}-{attempt})'
+                candidate = title[:255 - len(suffix)] + suffix
+                if not Product.objects.filter(title=candidate).exists():
+                    break
+                attempt += 1
+            Product.objects.filter(pk=product.pk).update(title=candidate)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce_app', '0012_product_reserved_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['placed_at', 'id'], name='order_placed_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'placed_at', 'id'], name='order_customer_placed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'placed_at', 'id'], name='order_status_placed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['last_update', 'id'], name='product_last_update_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'date', 'id'], name='review_product_date_idx'),
+        ),
+        migrations.RunPython(make_titles_unique, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('title',), name='unique_product_title'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 18:02
+
+from django.db import migrations, models
+import ecommerce_app.ids
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce_app', '0016_cart_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cart',
+            name='id',
+            field=models.UUIDField(default=ecommerce_app.ids.new_cart_id, primary_key=True, serialize=False),
+        ),
+    ]
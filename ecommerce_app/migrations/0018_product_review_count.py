@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 18:36
+
+from django.db import migrations, models
+
+from ecommerce_app.review_stats import rebuild_batch
+
+
+def backfill_review_count(apps, schema_editor):
+    Product = apps.get_model('ecommerce_app', 'Product')
+    Review = apps.get_model('ecommerce_app', 'Review')
+    after_id = 0
+    while ids := rebuild_batch(after_id, 1000, Product, Review):
+        after_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce_app', '0017_cart_time_ordered_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_review_count, migrations.RunPython.noop),
+    ]
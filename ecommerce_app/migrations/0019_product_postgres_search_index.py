@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+# Same expression as ecommerce_app.search.PG_DOCUMENT
+PG_DOCUMENT = (
+    "setweight(to_tsvector('simple', title), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
+
+# PostgreSQL searches through this index, other databases use the FTS5
+# table of 0014 or the Python index in ecommerce_app.search
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'CREATE INDEX IF NOT EXISTS product_search_idx ON ecommerce_app_product USING GIN (({PG_DOCUMENT}))')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS product_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce_app', '0018_product_review_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,18 +1,42 @@
 from django.core.validators import MinValueValidator
 from django.db import models
-from uuid import uuid4
+from django.db.models import Case, ExpressionWrapper, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .ids import new_cart_id
+from decimal import Decimal
 from django.contrib.auth.models import User
 
 
 
 
+# Output type of price arithmetic done by the database
+MONEY_FIELD = models.DecimalField(max_digits=12, decimal_places=2)
+
+
 class Product(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(null=True, blank=True)
     unit_price = models.DecimalField(max_digits=6,decimal_places=2,validators=[MinValueValidator(1)])
     inventory = models.IntegerField(validators=[MinValueValidator(0)], editable=True)
+    # Units currently held by carts through StockReservation rows
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+    # Kept up to date by the Review signals, rebuilt by the backfill_review_stats command
+    review_count = models.PositiveIntegerField(default=0, editable=False)
     last_update = models.DateTimeField(auto_now=True)
 
+    # Only ever changed with F() updates, a save of a row loaded earlier
+    # would write back a stale value over concurrent changes
+    COUNTER_FIELDS = ('reserved', 'review_count')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def inventory_update(self, inventory):
         """
         Update the product inventory.
@@ -21,8 +45,46 @@ class Product(models.Model):
         self.inventory = inventory
         self.save()
 
+    @classmethod
+    def decrement_inventory(cls, quantities, held=None):
+        """
+        Take `quantities` ({product_id: quantity}) out of stock with a single
+        conditional UPDATE, converting the units in `held` ({product_id: quantity})
+        that the buyer already reserved. Stock reserved by other carts is never
+        sold, and products without enough stock are left untouched, so callers
+        compare the returned row count with len(quantities).
+
+        """
+        held = held or {}
+        quantity = Case(
+            *[When(pk=product_id, then=Value(amount)) for product_id, amount in quantities.items()],
+            output_field=IntegerField(),
+        )
+        released = Case(
+            *[When(pk=product_id, then=Value(held.get(product_id, 0))) for product_id in quantities],
+            output_field=IntegerField(),
+        )
+        return cls.objects.filter(
+            pk__in=quantities.keys(),
+            inventory__gte=F('reserved') - released + quantity,
+        ).update(
+            inventory=F('inventory') - quantity,
+            reserved=F('reserved') - released,
+            last_update=timezone.now(),
+        )
+
     def __str__(self):
         return self.title
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['title'], name='unique_product_title'),
+        ]
+        indexes = [
+            # Catalog listing keysets, by recency and by price
+            models.Index(fields=['last_update', 'id'], name='product_last_update_idx'),
+            models.Index(fields=['unit_price', 'id'], name='product_unit_price_idx'),
+        ]
     
 class Customer(models.Model):
     
@@ -47,6 +109,14 @@ class Order(models.Model):
     placed_at = models.DateTimeField(auto_now_add=True)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
 
+    class Meta:
+        indexes = [
+            # Order history keysets, for everyone, per customer and per status
+            models.Index(fields=['placed_at', 'id'], name='order_placed_at_idx'),
+            models.Index(fields=['customer', 'placed_at', 'id'], name='order_customer_placed_idx'),
+            models.Index(fields=['status', 'placed_at', 'id'], name='order_status_placed_idx'),
+        ]
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.PROTECT, related_name='items')
@@ -57,9 +127,45 @@ class OrderItem(models.Model):
 
 
 
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate `total_cart_price` and `item_count`, summed by the database.
+
+        """
+        return self.annotate(
+            total_cart_price=Coalesce(
+                Sum(F('items__quantity') * F('items__product__unit_price'), output_field=MONEY_FIELD),
+                Value(Decimal('0')),
+                output_field=MONEY_FIELD,
+            ),
+            item_count=Coalesce(Sum('items__quantity'), Value(0)),
+        )
+
+    def touch(self):
+        """
+        Mark the carts as active now, which keeps them away from the reaper.
+
+        """
+        return self.update(updated_at=timezone.now())
+
+
 class Cart(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid4)
+    id = models.UUIDField(primary_key=True, default=new_cart_id)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Last time the cart or its items changed, carts idle for too long are reaped
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = CartQuerySet.as_manager()
+
+
+class CartItemQuerySet(models.QuerySet):
+    def with_price(self):
+        """
+        Annotate `price_in_total`, the line price computed by the database.
+
+        """
+        return self.annotate(price_in_total=ExpressionWrapper(F('quantity') * F('product__unit_price'), output_field=MONEY_FIELD))
 
 
 class CartItem(models.Model):
@@ -67,6 +173,24 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveSmallIntegerField(validators=[MinValueValidator(1)])
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('cart', 'product')
+
+
+class StockReservation(models.Model):
+    """
+    Units of a product held for a cart until `expires_at`. The sum of the
+    reservations of a product is mirrored in Product.reserved so that
+    availability can be checked and taken in one conditional UPDATE.
+
+    """
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
     class Meta:
         unique_together = ('cart', 'product')
 
@@ -79,3 +203,7 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ('product', 'customer')
+        indexes = [
+            # Reviews of a product, newest first
+            models.Index(fields=['product', 'date', 'id'], name='review_product_date_idx'),
+        ]
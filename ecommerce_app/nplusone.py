@@ -0,0 +1,211 @@
+"""
+N+1 query detection.
+
+While a detector is active (NPlusOneMiddleware per request in development,
+`detect_n_plus_one` around tests) every SELECT is reduced to its shape,
+the SQL with its parameters left out. A shape that runs `threshold` times
+within one DRF view call is almost always a relation lazily loaded once
+per row, so it is reported with the serializer field being rendered and
+the project line that ran it, and either logged or raised.
+
+"""
+import logging
+import os
+import re
+import sys
+import threading
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import TestContextDecorator
+from rest_framework.serializers import Serializer
+from rest_framework.views import APIView
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# `IN (%s, %s, ...)` lists of any length have the same shape
+_IN_LIST = re.compile(r'\((?:%s, )*%s\)')
+
+_current = ContextVar('nplusone_detector', default=None)
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+class Finding:
+    def __init__(self, shape, field, location):
+        self.shape = shape
+        self.field = field
+        self.location = location
+        self.count = 0
+
+    def __str__(self):
+        source = f'{self.field} at {self.location}' if self.field else self.location
+        return f'{self.count} similar queries from {source}: {self.shape}'
+
+
+class QueryWatch:
+    """
+    The queries seen by one request or test, by shape.
+
+    """
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = {}
+        self.findings = {}
+
+    def record(self, sql):
+        if not sql.lstrip()[:6].upper() == 'SELECT':
+            return
+        shape = _IN_LIST.sub('(...)', sql)
+        count = self.counts[shape] = self.counts.get(shape, 0) + 1
+        if count == self.threshold:
+            # The call site is only looked up once a shape repeats, the stack walk isn't free
+            self.findings[shape] = Finding(shape, *find_call_site())
+        if count >= self.threshold:
+            self.findings[shape].count = count
+
+    def merge(self, other):
+        for shape, finding in other.findings.items():
+            if finding.count > getattr(self.findings.get(shape), 'count', 0):
+                self.findings[shape] = finding
+
+    def report(self):
+        return list(self.findings.values())
+
+
+def _is_project_file(filename):
+    return (
+        filename.startswith(str(settings.BASE_DIR))
+        and 'site-packages' not in filename
+        and filename not in (__file__, metrics.__file__)
+    )
+
+
+def find_call_site():
+    """
+    The serializer field being rendered (`ReviewSerializer.username`) and
+    the innermost project line (`ecommerce_app/serializers.py:51 in
+    get_username`) of the query running now.
+
+    """
+    field = location = None
+    frame = sys._getframe(1)
+    while frame is not None and (field is None or location is None):
+        code = frame.f_code
+        if location is None and _is_project_file(code.co_filename):
+            path = os.path.relpath(code.co_filename, settings.BASE_DIR)
+            location = f'{path}:{frame.f_lineno} in {code.co_name}'
+        if field is None and code.co_name == 'to_representation':
+            serializer, rendered = frame.f_locals.get('self'), frame.f_locals.get('field')
+            if isinstance(serializer, Serializer) and rendered is not None:
+                field = f'{type(serializer).__name__}.{rendered.field_name}'
+        frame = frame.f_back
+    return field, location or 'unknown'
+
+
+def record_query(execute, sql, params, many, context):
+    watch = _current.get()
+    if watch is not None:
+        watch.record(sql)
+    return execute(sql, params, many, context)
+
+
+def instrument_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def instrument_views():
+    """
+    Give every DRF view call its own count, so a test making the same
+    request three times isn't taken for an N+1. Findings go to the
+    enclosing watch, views run without one aren't watched.
+
+    """
+    dispatch = APIView.dispatch
+    if getattr(dispatch, 'watched', False):
+        return
+
+    def watched_dispatch(self, request, *args, **kwargs):
+        parent = _current.get()
+        if parent is None:
+            return dispatch(self, request, *args, **kwargs)
+        watch = QueryWatch(parent.threshold)
+        token = _current.set(watch)
+        try:
+            return dispatch(self, request, *args, **kwargs)
+        finally:
+            _current.reset(token)
+            parent.merge(watch)
+
+    watched_dispatch.watched = True
+    APIView.dispatch = watched_dispatch
+
+
+def install():
+    """
+    Instrument DRF views and database connections. Done on startup when
+    NPLUSONE_DETECTION is on, otherwise by the first watch (a test under
+    `detect_n_plus_one`), so production never pays for the detector.
+
+    """
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        connection_created.connect(instrument_connection, dispatch_uid='ecommerce_app.nplusone')
+        for connection in connections.all(initialized_only=True):
+            instrument_connection(None, connection)
+        instrument_views()
+        _installed = True
+
+
+def start_watch(threshold=None):
+    install()
+    watch = QueryWatch(threshold or settings.NPLUSONE_THRESHOLD)
+    return watch, _current.set(watch)
+
+
+def end_watch(watch, token, raise_errors=False):
+    _current.reset(token)
+    findings = watch.report()
+    if findings:
+        message = 'N+1 queries detected:\n' + '\n'.join(f'  {finding}' for finding in findings)
+        if raise_errors:
+            raise NPlusOneError(message)
+        logger.warning(message)
+    return findings
+
+
+class detect_n_plus_one(TestContextDecorator):
+    """
+    Fail a test (or every test of a TestCase class) that runs the same
+    query shape `threshold` or more times. setUp isn't watched.
+
+    """
+    def __init__(self, threshold=None, raise_errors=True):
+        self.threshold = threshold
+        self.raise_errors = raise_errors
+        super().__init__()
+
+    def enable(self):
+        self.watch, self.token = start_watch(self.threshold)
+        return self.watch
+
+    def disable(self):
+        end_watch(self.watch, self.token, self.raise_errors)
+
+    def decorate_class(self, cls):
+        for name in dir(cls):
+            if name.startswith('test') and callable(getattr(cls, name)):
+                setattr(cls, name, self.decorate_callable(getattr(cls, name)))
+        return cls
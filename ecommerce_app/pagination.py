@@ -0,0 +1,208 @@
+import json
+from base64 import b64decode, b64encode
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError as APIValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .filters import PRODUCT_ORDERINGS
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over a compound ordering.
+
+    Each page is fetched with a `WHERE (a, b) < (x, y) ORDER BY a, b LIMIT n`
+    style query, so the cost only depends on the page size and never on how
+    deep the client has paged. The cursor is an opaque token holding the
+    ordering values of the row at the edge of the page, which keeps pages
+    stable while rows are being inserted concurrently.
+
+    The last ordering field must be unique (normally `id`).
+
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset for async views, fetching the page with the async ORM.
+
+        """
+        queryset = self.get_page_queryset(queryset, request, view)
+        return self.set_page([obj async for obj in queryset])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.fields = self.get_ordering(request, queryset, view)
+
+        self.position, self.reverse = self.decode_cursor(request, queryset.model)
+        fields = self.fields if not self.reverse else [(name, not desc) for name, desc in self.fields]
+
+        queryset = queryset.order_by(*[('-' if desc else '') + name for name, desc in fields])
+        if self.position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(fields, self.position))
+
+        # Fetching one extra row tells us whether there is another page
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+
+        has_cursor = self.position is not None
+        self.has_next = has_cursor if self.reverse else has_more
+        self.has_previous = has_more if self.reverse else has_cursor
+        return self.page
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Return the ordering as a list of `(field_name, descending)` pairs.
+
+        """
+        return [(field.lstrip('-'), field.startswith('-')) for field in self.ordering]
+
+    def get_keyset_filter(self, fields, position):
+        # (a, b, c) after (x, y, z) expands to
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        for index, (name, desc) in enumerate(fields):
+            term = Q(**{f'{name}__{"lt" if desc else "gt"}': position[index]})
+            for prefix_index, (prefix_name, _) in enumerate(fields[:index]):
+                term &= Q(**{prefix_name: position[prefix_index]})
+            condition |= term
+        # Implied by the condition, but unlike the OR it lets the database
+        # start the index scan at the cursor instead of skipping earlier rows
+        name, desc = fields[0]
+        return Q(**{f'{name}__{"lte" if desc else "gte"}': position[0]}) & condition
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_position(self, instance):
+        position = []
+        for name, _ in self.fields:
+            value = getattr(instance, name)
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            position.append(value)
+        return position
+
+    def get_ordering_key(self):
+        # Recorded in cursors, a cursor only continues the ordering that made it
+        return ','.join(('-' if desc else '') + name for name, desc in self.fields)
+
+    def encode_cursor(self, instance, reverse):
+        token = json.dumps({'p': self.get_position(instance), 'r': int(reverse), 'o': self.get_ordering_key()}, separators=(',', ':'))
+        encoded = b64encode(token.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+
+        try:
+            token = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position, reverse, ordering = token['p'], bool(token['r']), token['o']
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if ordering != self.get_ordering_key():
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        return self.coerce_position(model, position), reverse
+
+    def coerce_position(self, model, position):
+        # Cursors come from clients, every value is checked against its field
+        # here so a tampered one is a 404 rather than an error in the query
+        coerced = []
+        for (name, _), value in zip(self.fields, position):
+            if value is None or isinstance(value, (dict, list, bool)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                value = model._meta.get_field(name).to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            coerced.append(value)
+        return coerced
+
+
+class ProductPagination(KeysetPagination):
+    ordering = ('-last_update', '-id')
+    ordering_query_param = 'ordering'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_query_param)
+        if ordering:
+            if ordering not in PRODUCT_ORDERINGS:
+                raise APIValidationError({self.ordering_query_param: [f'Expected one of {", ".join(PRODUCT_ORDERINGS)}.']})
+            return [(field.lstrip('-'), field.startswith('-')) for field in PRODUCT_ORDERINGS[ordering]]
+        return super().get_ordering(request, queryset, view)
+
+
+class OrderPagination(KeysetPagination):
+    ordering = ('-placed_at', '-id')
+
+
+class ReviewPagination(KeysetPagination):
+    ordering = ('-date', '-id')
@@ -17,4 +17,4 @@ class ReviewOwnerOrAdminOrReadOnly(permissions.BasePermission):
             return True
             
          # Allowing review owner to perform actions on their own review
-        return obj.customer.user == request.user
\ No newline at end of file
+        return obj.customer.user_id == request.user.id
\ No newline at end of file
@@ -0,0 +1,77 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .inventory import release_carts
+from .models import Cart, CartItem
+
+# Carts untouched for longer than this are deleted
+CART_IDLE_TTL = getattr(settings, 'CART_IDLE_TTL', timedelta(days=7))
+
+
+def reap_batch(cutoff, batch_size):
+    """
+    Delete up to `batch_size` carts idle since before `cutoff`, oldest first,
+    in one short transaction. Returns the number of carts deleted.
+
+    """
+    with transaction.atomic():
+        stale = Cart.objects.filter(updated_at__lt=cutoff)
+        ids = list(stale.order_by('updated_at').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+
+        # Carts touched since they were selected are left alone
+        stale = stale.filter(pk__in=ids)
+        release_carts(stale.values('pk'))
+        CartItem.objects.filter(cart__in=stale.values('pk')).delete()
+
+        # Reservations and items are already gone, so the carts go in one
+        # plain DELETE rather than delete() and its per-cart pre_delete signal
+        return delete_carts(ids, cutoff)
+
+
+def delete_carts(ids, cutoff):
+    connection = connections[router.db_for_write(Cart)]
+    quote = connection.ops.quote_name
+    pk, updated_at = Cart._meta.pk, Cart._meta.get_field('updated_at')
+    params = [pk.get_db_prep_value(cart_id, connection) for cart_id in ids]
+    params.append(updated_at.get_db_prep_value(cutoff, connection))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(Cart._meta.db_table)} '
+            f'WHERE {quote(pk.column)} IN ({", ".join(["%s"] * len(ids))}) AND {quote(updated_at.column)} < %s',
+            params,
+        )
+        return cursor.rowcount
+
+
+def reap_carts(ttl=None, batch_size=500, pause=0.0, limit=None):
+    """
+    Delete every cart idle for longer than `ttl` in bounded batches, sleeping
+    `pause` seconds between batches to leave room for regular traffic.
+    Returns a `{'deleted', 'batches', 'seconds', 'per_second'}` report.
+
+    """
+    cutoff = timezone.now() - (ttl or CART_IDLE_TTL)
+    deleted = batches = 0
+    start = time.monotonic()
+    while limit is None or deleted < limit:
+        count = reap_batch(cutoff, batch_size if limit is None else min(batch_size, limit - deleted))
+        if not count:
+            break
+        deleted += count
+        batches += 1
+        if pause:
+            time.sleep(pause)
+
+    seconds = time.monotonic() - start
+    return {
+        'deleted': deleted,
+        'batches': batches,
+        'seconds': round(seconds, 3),
+        'per_second': round(deleted / seconds, 1) if seconds else None,
+    }
@@ -0,0 +1,93 @@
+import hashlib
+import math
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Set for the duration of a request that may read from a replica
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_aliases():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+@contextmanager
+def use_replicas(enabled=True):
+    """
+    Let reads in the block go to a replica (or force them to the primary
+    with `enabled=False`). Outside of such a block everything runs on the
+    primary, so management commands and background jobs never see stale
+    rows.
+
+    """
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to a random replica inside `use_replicas()` blocks and
+    everything else to the primary. Replicas hold the same data, so
+    relations across aliases are allowed.
+
+    """
+    def db_for_read(self, model, **hints):
+        aliases = replica_aliases()
+        if aliases and _replica_reads.get():
+            return random.choice(aliases)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+# Set on write responses, so clients without credentials (a sign-up
+# followed by a login) keep reading the primary for the sticky window
+PIN_COOKIE = 'replicas_pin'
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+def client_keys(request):
+    """
+    Cache keys of the caller's credentials for the sticky primary window:
+    the Authorization header (JWT authentication runs later, in the view)
+    and the session cookie. Clients sharing an address (behind a proxy or
+    NAT) are never pinned together.
+
+    """
+    identities = [request.META.get('HTTP_AUTHORIZATION'), request.COOKIES.get(settings.SESSION_COOKIE_NAME)]
+    return [
+        'replicas:primary:' + hashlib.md5(identity.encode('utf-8')).hexdigest()
+        for identity in identities if identity
+    ]
+
+
+def pin_to_primary(request):
+    keys = client_keys(request)
+    if keys:
+        cache.set_many({key: 1 for key in keys}, sticky_seconds())
+
+
+def pin_response(response):
+    response.set_cookie(PIN_COOKIE, '1', max_age=max(1, math.ceil(sticky_seconds())), httponly=True, samesite='Lax')
+    return response
+
+
+def is_pinned_to_primary(request):
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    keys = client_keys(request)
+    return bool(keys and cache.get_many(keys))
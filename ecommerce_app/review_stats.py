@@ -0,0 +1,51 @@
+import time
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Product, Review
+
+
+def adjust_review_count(product_id, delta):
+    """
+    Add `delta` to a product's review count in place. Neither last_update
+    nor the catalog cache are touched, so listings may show the old count
+    for up to PRODUCT_CACHE_TIMEOUT, like stock after a checkout.
+
+    """
+    Product.objects.filter(pk=product_id).update(review_count=F('review_count') + delta)
+
+
+def rebuild_batch(after_id, batch_size, product_model=Product, review_model=Review):
+    """
+    Recount the reviews of the `batch_size` products following `after_id`
+    with one UPDATE. Returns the ids of the products recounted. Migrations
+    pass their historical models.
+
+    """
+    ids = list(product_model.objects.filter(pk__gt=after_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+    if ids:
+        counts = review_model.objects.filter(product_id=OuterRef('pk')).order_by().values('product_id').annotate(count=Count('pk')).values('count')
+        product_model.objects.filter(pk__in=ids).update(review_count=Coalesce(Subquery(counts), Value(0)))
+    return ids
+
+
+def rebuild_review_stats(batch_size=1000, pause=0.0):
+    """
+    Recompute the review count of every product in batches of `batch_size`
+    products, sleeping `pause` seconds between batches. Returns a
+    `{'products', 'batches', 'seconds'}` report.
+
+    """
+    after_id = products = batches = 0
+    start = time.monotonic()
+    while True:
+        ids = rebuild_batch(after_id, batch_size)
+        if not ids:
+            break
+        products += len(ids)
+        after_id = ids[-1]
+        batches += 1
+        if pause:
+            time.sleep(pause)
+    return {'products': products, 'batches': batches, 'seconds': round(time.monotonic() - start, 3)}
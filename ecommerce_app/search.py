@@ -0,0 +1,338 @@
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import connections, router
+
+from .models import Product
+from .replicas import use_replicas
+
+FTS_TABLE = 'ecommerce_app_product_fts'
+
+# Keep the FTS5 table in step with ecommerce_app_product. SQLite drops them
+# whenever a migration rebuilds the product table, restore_search_triggers
+# puts them back after every migrate
+FTS_TRIGGERS = {
+    f'{FTS_TABLE}_insert': (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON ecommerce_app_product BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description); END"
+    ),
+    f'{FTS_TABLE}_delete': (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON ecommerce_app_product BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); END"
+    ),
+    # Stock and price updates don't touch the index
+    f'{FTS_TABLE}_update': (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF title, description ON ecommerce_app_product BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description); END"
+    ),
+}
+
+# Expression of the GIN index created by migration 0019 on PostgreSQL, the
+# queries have to repeat it verbatim for the index to be used
+PG_DOCUMENT = (
+    "setweight(to_tsvector('simple', title), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
+# Bumped on every catalog write, tells the Python index of each process
+# that it missed writes made elsewhere
+GENERATION_KEY = 'search:generation'
+TOKEN_RE = re.compile(r'\w+')
+
+# Title matches count this many times more than description matches
+TITLE_WEIGHT = 10.0
+
+# Upper bound of index terms a single prefix may expand to in the Python index
+MAX_PREFIX_EXPANSIONS = 64
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+class SQLiteFTSBackend:
+    """
+    Product search on the SQLite FTS5 table created by migration 0014.
+
+    The table is an external content index over ecommerce_app_product kept
+    up to date by triggers, so every write path (ORM saves, bulk imports,
+    raw SQL) reindexes the row in the same transaction.
+
+    """
+    def search(self, query, offset=0, limit=20):
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        # Every term has to match, as a prefix so partially typed words still find products
+        match = ' '.join(f'"{term}"*' for term in terms)
+        connection = connections[router.db_for_read(Product)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, %s, 1.0), rowid LIMIT %s OFFSET %s',
+                [match, TITLE_WEIGHT, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index(self, product):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def invalidate(self):
+        pass
+
+    def rebuild(self):
+        connection = connections[router.db_for_write(Product)]
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+class PostgresFTSBackend:
+    """
+    Product search with PostgreSQL full text search, over the GIN index on
+    PG_DOCUMENT created by migration 0019. Like the FTS5 table, the index is
+    maintained by the database, so there is nothing to keep in step.
+
+    """
+    # ts_rank weights of D, C, B (description) and A (title)
+    weights = '{0, 0, %s, 1}' % (1 / TITLE_WEIGHT)
+
+    def search(self, query, offset=0, limit=20):
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        # Every term has to match, as a prefix so partially typed words still find products
+        match = ' & '.join(f"'{term}':*" for term in terms)
+        connection = connections[router.db_for_read(Product)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM ecommerce_app_product WHERE ({PG_DOCUMENT}) @@ to_tsquery('simple', %s) "
+                f"ORDER BY ts_rank(%s::float4[], {PG_DOCUMENT}, to_tsquery('simple', %s)) DESC, id LIMIT %s OFFSET %s",
+                [match, self.weights, match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index(self, product):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def invalidate(self):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+def get_generation():
+    return cache.get(GENERATION_KEY, 0)
+
+
+def bump_generation():
+    cache.add(GENERATION_KEY, 0, None)
+    try:
+        return cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(GENERATION_KEY, 1, None)
+        return 1
+
+
+class InvertedIndex:
+    """
+    Pure Python BM25 inverted index, used on databases without FTS5 or
+    PostgreSQL full text search.
+
+    The index is built from the database on the first search and kept up to
+    date by the Product save/delete signals of this process (once their
+    transaction commits). Every write also bumps GENERATION_KEY in the
+    cache, so a process that sees a generation it didn't produce itself
+    rebuilds its index on the next search.
+
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._loaded = False
+        self._generation = None
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        self._terms = []
+        self._terms_dirty = False
+        self._total_length = 0.0
+
+    def _frequencies(self, title, description):
+        frequencies = defaultdict(float)
+        for term in tokenize(title):
+            frequencies[term] += TITLE_WEIGHT
+        for term in tokenize(description):
+            frequencies[term] += 1.0
+        return frequencies
+
+    def _add(self, product_id, title, description):
+        self._discard(product_id)
+        frequencies = self._frequencies(title, description)
+        for term, frequency in frequencies.items():
+            if term not in self._postings:
+                self._terms_dirty = True
+            self._postings[term][product_id] = frequency
+        self._documents[product_id] = (list(frequencies), sum(frequencies.values()))
+        self._total_length += self._documents[product_id][1]
+
+    def _discard(self, product_id):
+        document = self._documents.pop(product_id, None)
+        if document is None:
+            return
+        terms, length = document
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                self._terms_dirty = True
+
+    def _load(self):
+        # Read before the rows, a write landing during the load bumps it again
+        generation = get_generation()
+        if self._loaded and generation == self._generation:
+            return
+        self._reset()
+        # From the primary, the index outlives the request that loads it
+        with use_replicas(False):
+            for product_id, title, description in Product.objects.values_list('id', 'title', 'description').iterator(chunk_size=5000):
+                self._add(product_id, title, description)
+        self._loaded = True
+        self._generation = generation
+
+    def _expand(self, prefix):
+        if self._terms_dirty:
+            self._terms = sorted(self._postings)
+            self._terms_dirty = False
+        start = bisect_left(self._terms, prefix)
+        expansions = []
+        for term in self._terms[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            expansions.append(term)
+        return expansions
+
+    def search(self, query, offset=0, limit=20):
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            self._load()
+            if not self._documents:
+                return []
+            count = len(self._documents)
+            average_length = self._total_length / count
+
+            scores = None
+            for prefix in terms:
+                term_scores = defaultdict(float)
+                for term in self._expand(prefix):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for product_id, frequency in postings.items():
+                        length = self._documents[product_id][1]
+                        norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                        term_scores[product_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+                # Every term has to match
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {product_id: score + term_scores[product_id] for product_id, score in scores.items() if product_id in term_scores}
+                if not scores:
+                    return []
+
+            ranked = heapq.nsmallest(offset + limit, scores.items(), key=lambda item: (-item[1], item[0]))
+            return [product_id for product_id, _ in ranked[offset:]]
+
+    def _applied(self):
+        # Still current if no other process wrote since this index was loaded
+        generation = bump_generation()
+        if self._generation == generation - 1:
+            self._generation = generation
+
+    def index(self, product):
+        with self._lock:
+            if self._loaded:
+                self._add(product.id, product.title, product.description)
+            self._applied()
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._loaded:
+                self._discard(product_id)
+            self._applied()
+
+    def invalidate(self):
+        with self._lock:
+            self._reset()
+        bump_generation()
+
+    def rebuild(self):
+        self.invalidate()
+        with self._lock:
+            self._load()
+
+
+def restore_search_triggers(using='default', **kwargs):
+    """
+    post_migrate receiver recreating missing FTS5 triggers, and rebuilding
+    the index from the table since writes made without them were missed.
+
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or FTS_TABLE not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'ecommerce_app_product'")
+        existing = {name for (name,) in cursor.fetchall()}
+        if existing.issuperset(FTS_TRIGGERS):
+            return
+        for statement in FTS_TRIGGERS.values():
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """
+    Return the FTS5 backend when the product index table exists, PostgreSQL
+    full text search on PostgreSQL, otherwise the in-process Python index.
+
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            connection = connections[router.db_for_read(Product)]
+            if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+                _backend = SQLiteFTSBackend()
+            elif connection.vendor == 'postgresql':
+                _backend = PostgresFTSBackend()
+            else:
+                _backend = InvertedIndex()
+        return _backend
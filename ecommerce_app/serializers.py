@@ -3,32 +3,48 @@ from .models import Product, Customer, Review, Cart, CartItem, Order, OrderItem
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
-from django.db import transaction
-from django.db.models import F
+from django.db import IntegrityError, transaction
+from .inventory import hold_stock, hold_cart_stock, commit_cart
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
     
+    # No two products can share a title. This is enforced by the unique_product_title
+    # constraint, a savepoint keeps the surrounding transaction usable when it fires
     def create(self, validated_data):
-        
-        # Check for no two objects with the same name can be created
-        if Product.objects.filter(title=validated_data['title']).exists():
-            raise serializers.ValidationError('Product with this title already exists.')
-        
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            self.check_title_is_free(validated_data)
+            raise
 
-        # Calling the original create method
-        return super().create(validated_data)
-    
     def update(self, instance, validated_data):
-
-        # Check for name duplicacy
-        if 'title' in validated_data and Product.objects.exclude(pk=instance.pk).filter(title=validated_data['title']).exists():
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            self.check_title_is_free(validated_data, instance)
+            raise
+
+    def check_title_is_free(self, validated_data, instance=None):
+        # Only a clash with another product's title is the client's fault,
+        # other integrity errors are re-raised by the caller
+        if 'title' not in validated_data:
+            return
+        others = Product.objects.filter(title=validated_data['title'])
+        if instance is not None:
+            others = others.exclude(pk=instance.pk)
+        if others.exists():
             raise serializers.ValidationError('Product with this title already exists.')
-        
-        # Calling the original update method
-        return super().update(instance, validated_data)
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ['title', 'description', 'unit_price', 'inventory']
 
 
 class CustomerSerializer(serializers.ModelSerializer):
@@ -70,7 +86,10 @@ class CartItemSerializer(serializers.ModelSerializer):
     product = CustomProductInCartSerializer()
     price_in_total = serializers.SerializerMethodField()
 
+    # Listings annotate the line price in the database (CartItem.objects.with_price)
     def get_price_in_total(self, cart_item: CartItem):
+        if hasattr(cart_item, 'price_in_total'):
+            return cart_item.price_in_total
         return cart_item.quantity * cart_item.product.unit_price
     
     class Meta:
@@ -94,24 +113,20 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         product_id = self.validated_data['product_id']
         quantity = self.validated_data['quantity']
 
-        try:
-            # Inventory check
-            product = Product.objects.get(id=product_id)
-            inventory_check = product.inventory - quantity 
-            
-
-            if inventory_check < 0:
-                raise ValidationError('Desired quantity not present in stock')
-
-            # If an item exists in the cart already, it increases the quantity of the cart item
-            cart_item = CartItem.objects.get(cart_id=cart_id, product_id=product_id)
-            cart_item.quantity += quantity
+        with transaction.atomic():
+            try:
+                # If an item exists in the cart already, it increases the quantity of the cart item
+                cart_item = CartItem.objects.get(cart_id=cart_id, product_id=product_id)
+                cart_item.quantity += quantity
+            except CartItem.DoesNotExist:
+                cart_item = CartItem(cart_id=cart_id, **self.validated_data)
+
+            # Inventory check, the units stay reserved for the cart until checkout or expiry
+            hold_stock(cart_id, product_id, cart_item.quantity)
             cart_item.save()
+            Cart.objects.filter(pk=cart_id).touch()
             self.instance = cart_item
 
-        except CartItem.DoesNotExist:
-            self.instance = CartItem.objects.create(cart_id=cart_id, **self.validated_data)
-
         return self.instance
 
     class Meta:
@@ -124,6 +139,90 @@ class UpdateCartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ['quantity']
 
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            if 'quantity' in validated_data:
+                hold_stock(instance.cart_id, instance.product_id, validated_data['quantity'])
+            Cart.objects.filter(pk=instance.cart_id).touch()
+            return super().update(instance, validated_data)
+
+
+class CartItemOperationSerializer(serializers.Serializer):
+    # add: increase the quantity, set: replace it (0 removes the item), remove: drop the item
+    op = serializers.ChoiceField(choices=['add', 'set', 'remove'], default='add')
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, max_value=32767, required=False)
+
+    def validate(self, attrs):
+        if attrs['op'] == 'add' and not attrs.get('quantity'):
+            raise serializers.ValidationError({'quantity': ['A quantity of at least 1 is required.']})
+        if attrs['op'] == 'set' and attrs.get('quantity') is None:
+            raise serializers.ValidationError({'quantity': ['This field is required.']})
+        return attrs
+
+
+class BatchCartItemSerializer(serializers.Serializer):
+    """
+    Applies a list of add/set/remove operations to the items of a cart in
+    one transaction, with a fixed number of queries for the whole batch.
+
+    """
+    operations = CartItemOperationSerializer(many=True, allow_empty=False, max_length=100)
+
+    def validate_operations(self, operations):
+        product_ids = {operation['product_id'] for operation in operations}
+        existing = set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+        if product_ids - existing:
+            raise serializers.ValidationError(
+                [f'No product with the id {product_id} exists.' for product_id in sorted(product_ids - existing)]
+            )
+        return operations
+
+    def save(self, **kwargs):
+        cart_id = self.context['cart_id']
+        if not Cart.objects.filter(pk=cart_id).exists():
+            raise ValidationError('No cart with the id exists.')
+
+        operations = self.validated_data['operations']
+        product_ids = {operation['product_id'] for operation in operations}
+
+        with transaction.atomic():
+            quantities = dict(
+                CartItem.objects.filter(cart_id=cart_id, product_id__in=product_ids).values_list('product_id', 'quantity')
+            )
+            current = dict(quantities)
+            for operation in operations:
+                quantity = current.get(operation['product_id'], 0)
+                if operation['op'] == 'add':
+                    quantity += operation['quantity']
+                elif operation['op'] == 'set':
+                    quantity = operation['quantity']
+                else:
+                    quantity = 0
+                current[operation['product_id']] = quantity
+
+            if any(quantity > 32767 for quantity in current.values()):
+                raise ValidationError({'quantity': ['Ensure this value is less than or equal to 32767.']})
+
+            # Only products whose quantity actually changes touch the stock
+            changed = {product_id: quantity for product_id, quantity in current.items() if quantities.get(product_id, 0) != quantity}
+            if changed:
+                hold_cart_stock(cart_id, changed)
+
+            removed = [product_id for product_id, quantity in changed.items() if quantity == 0]
+            if removed:
+                CartItem.objects.filter(cart_id=cart_id, product_id__in=removed).delete()
+            upserts = [
+                CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+                for product_id, quantity in changed.items() if quantity
+            ]
+            if upserts:
+                CartItem.objects.bulk_create(
+                    upserts, update_conflicts=True, unique_fields=['cart', 'product'], update_fields=['quantity']
+                )
+            Cart.objects.filter(pk=cart_id).touch()
+
+        return cart_id
 
 
 class CartSerializer(serializers.ModelSerializer):
@@ -131,14 +230,25 @@ class CartSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     items = CartItemSerializer(many=True,read_only=True)
     total_cart_price = serializers.SerializerMethodField()
+    item_count = serializers.SerializerMethodField()
+
+    # Totals are summed by the database (Cart.objects.with_totals), carts that were
+    # not loaded that way (e.g. a freshly created one) are aggregated on demand
+    def load_totals(self, cart):
+        if not hasattr(cart, 'total_cart_price'):
+            totals = Cart.objects.with_totals().values('total_cart_price', 'item_count').get(pk=cart.pk)
+            cart.total_cart_price, cart.item_count = totals['total_cart_price'], totals['item_count']
+        return cart
 
-    # method for calculating all the cart items in the cart
     def get_total_cart_price(self, cart):
-        return sum([item.quantity * item.product.unit_price for item in cart.items.all()])
+        return self.load_totals(cart).total_cart_price
+
+    def get_item_count(self, cart):
+        return self.load_totals(cart).item_count
 
     class Meta:
         model = Cart
-        fields = ['id','items','total_cart_price']
+        fields = ['id','items','total_cart_price','item_count']
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -173,29 +283,20 @@ class CreateOrderSerializer(serializers.Serializer):
 
         with transaction.atomic():
             cart_id = self.validated_data['cart_id']
-            customer = Customer.objects.get(user_id=self.context['user_id'])
-            order = Order.objects.create(customer=customer)
-
-            cart_items = CartItem.objects.select_related('product').filter(cart_id=cart_id)
-
-
-            order_items = []
-            for item in cart_items:
-                order_item = OrderItem(
-                    order=order,
-                    product=item.product,
-                    unit_price=item.product.unit_price,
-                    quantity=item.quantity
-                )
-                
-                
-
-                Product.objects.get(pk=item.product.id).inventory_update(inventory=F('inventory') - (item.product.inventory- item.quantity))
+            customer_id = self.context.get('customer_id') or Customer.objects.get(user_id=self.context['user_id']).id
 
-                order_items.append(order_item)
+            cart_items = list(CartItem.objects.filter(cart_id=cart_id).values_list('product_id', 'quantity', 'product__unit_price'))
 
+            # All inventories are decremented in one conditional UPDATE that also converts the
+            # cart's reservations. If any product is short on stock the whole checkout rolls back
+            quantities = {product_id: quantity for product_id, quantity, _ in cart_items}
+            commit_cart(cart_id, quantities)
 
-            OrderItem.objects.bulk_create(order_items)
+            order = Order.objects.create(customer_id=customer_id)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=product_id, unit_price=unit_price, quantity=quantity)
+                for product_id, quantity, unit_price in cart_items
+            ])
 
             # Deleting cart object for successfully placed order
             Cart.objects.filter(pk=cart_id).delete()
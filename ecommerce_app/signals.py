@@ -1,7 +1,13 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Customer
+from django.db import transaction
+from .models import Customer, Cart, Product, Review
+from .cache import product_cache
+from .search import get_search_backend
+from .inventory import release_carts
+from .customers import forget_customer
+from .review_stats import adjust_review_count
 
 # Signal for autocreation of Customer object once a user is created
 @receiver(post_save, sender=User)
@@ -13,4 +19,49 @@ def create_customer(sender, **kwargs):
 @receiver(post_delete, sender=Customer)
 def delete_user(sender, instance, **kwargs):
     if instance.user:
-        instance.user.delete()
\ No newline at end of file
+        instance.user.delete()
+
+# Signal for dropping the cached customer of a user once its profile is written. Again
+# after commit, so a request that read the old row in the meantime can't keep it cached
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_customer_cache(sender, instance, **kwargs):
+    forget_customer(instance.user_id)
+    transaction.on_commit(lambda: forget_customer(instance.user_id))
+
+# Signal for returning reserved stock when a cart is deleted without checking out
+@receiver(pre_delete, sender=Cart)
+def release_cart_reservations(sender, instance, **kwargs):
+    release_carts([instance.pk])
+
+
+# Signal for dropping cached catalog pages once a product is written. The second
+# invalidation after commit evicts pages cached from the old row in the meantime
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, **kwargs):
+    product_cache.invalidate()
+    transaction.on_commit(product_cache.invalidate)
+
+
+# Signals for keeping the product search index in step with the catalog,
+# applied on commit so rolled back writes never reach the index
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    transaction.on_commit(lambda: get_search_backend().index(instance))
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: get_search_backend().remove(pk))
+
+
+# Signals for keeping the review count of products current without recounting
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, **kwargs):
+    if created:
+        adjust_review_count(instance.product_id, 1)
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+    adjust_review_count(instance.product_id, -1)
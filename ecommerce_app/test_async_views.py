@@ -0,0 +1,111 @@
+import json
+from base64 import b64encode
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import include, path
+
+from . import async_views
+from .models import Cart, CartItem, Customer, Product, Review
+from .views import CartViewSet, ProductViewSet, ReviewViewSet
+
+# The async views mounted somewhere else than /shop/, for AsgiReadHandlerTestCase
+urlpatterns = [
+    path('api/v2/', include('ecommerce_app.async_urls')),
+]
+
+
+class AsyncReadViewsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.async_factory = AsyncRequestFactory()
+        self.products = [Product.objects.create(title=f'Product {i}', unit_price='9.99', inventory=i) for i in range(5)]
+        self.cart = Cart.objects.create()
+        CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=2)
+        customer = Customer.objects.get(user=User.objects.create_user(username='reviewer', password='password'))
+        Review.objects.create(product=self.products[0], customer=customer, description='Great')
+
+    def sync_json(self, view, path, **kwargs):
+        response = view(self.factory.get(path), **kwargs)
+        response.render()
+        return response.status_code, json.loads(response.content)
+
+    async def sync_call(self, view, path, **kwargs):
+        return await sync_to_async(self.sync_json)(view, path, **kwargs)
+
+    async def async_json(self, view, path, **kwargs):
+        response = await view(self.async_factory.get(path), **kwargs)
+        return response.status_code, json.loads(response.content)
+
+    async def test_product_list_matches_viewset(self):
+        path = '/shop/products/?page_size=2&in_stock=true'
+        expected = await self.sync_call(ProductViewSet.as_view({'get': 'list'}), path)
+        cache.clear()
+        self.assertEqual(await self.async_json(async_views.product_list, path), expected)
+
+    async def test_product_detail_and_not_found(self):
+        pk = self.products[2].pk
+        expected = await self.sync_call(ProductViewSet.as_view({'get': 'retrieve'}), f'/shop/products/{pk}/', pk=pk)
+        self.assertEqual(await self.async_json(async_views.product_detail, f'/shop/products/{pk}/', pk=pk), expected)
+        status, data = await self.async_json(async_views.product_detail, '/shop/products/abc/', pk='abc')
+        self.assertEqual((status, data), (404, {'detail': 'Not found.'}))
+
+    async def test_cart_detail_matches_viewset(self):
+        path = f'/shop/carts/{self.cart.pk}/'
+        expected = await self.sync_call(CartViewSet.as_view({'get': 'retrieve'}), path, pk=self.cart.pk)
+        self.assertEqual(await self.async_json(async_views.cart_detail, path, pk=self.cart.pk), expected)
+
+    async def test_review_list_matches_viewset(self):
+        pk = self.products[0].pk
+        path = f'/shop/products/{pk}/reviews/'
+        expected = await self.sync_call(ReviewViewSet.as_view({'get': 'list'}), path, product_pk=pk)
+        status, data = await self.async_json(async_views.review_list, path, product_pk=pk)
+        self.assertEqual((status, data), expected)
+        self.assertEqual(data['results'][0]['username'], 'reviewer')
+
+    async def test_invalid_cursor(self):
+        status, data = await self.async_json(async_views.product_list, '/shop/products/?cursor=bogus')
+        self.assertEqual((status, data), (404, {'detail': 'Invalid cursor'}))
+        cursor = b64encode(json.dumps({'p': ['notadate', 1], 'r': 0, 'o': '-last_update,-id'}).encode()).decode()
+        status, data = await self.async_json(async_views.product_list, f'/shop/products/?cursor={quote(cursor)}')
+        self.assertEqual((status, data), (404, {'detail': 'Invalid cursor'}))
+
+    async def test_writes_use_viewset(self):
+        response = await async_views.cart_detail(self.async_factory.delete(f'/shop/carts/{self.cart.pk}/'), pk=self.cart.pk)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(await Cart.objects.filter(pk=self.cart.pk).aexists())
+
+
+@override_settings(ROOT_URLCONF='ecommerce_app.test_async_views')
+class AsgiReadHandlerTestCase(TransactionTestCase):
+    # The ASGI handler runs its sync code in a thread (and connection) of its own
+    def setUp(self):
+        from ecommerce import asgi
+        self.asgi = asgi
+        Product.objects.create(title='Product A', unit_price='9.99', inventory=1)
+
+    def scope(self, path, method='GET'):
+        return {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': [], 'server': ('testserver', 80)}
+
+    def test_routes_reads_of_async_views_wherever_mounted(self):
+        self.assertTrue(self.asgi.is_async_read(self.scope('/api/v2/products/')))
+        self.assertTrue(self.asgi.is_async_read(self.scope('/api/v2/products/1/reviews/')))
+        self.assertFalse(self.asgi.is_async_read(self.scope('/api/v2/products/', method='POST')))
+        self.assertFalse(self.asgi.is_async_read(self.scope('/shop/products/')))
+
+    async def test_read_handler_runs_the_read_middleware_only(self):
+        communicator = ApplicationCommunicator(self.asgi.read_application, self.scope('/api/v2/products/'))
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(5)
+        body = await communicator.receive_output(5)
+        headers = {name.decode().lower() for name, _ in start['headers']}
+        self.assertEqual(start['status'], 200)
+        self.assertEqual(json.loads(body['body'])['results'][0]['title'], 'Product A')
+        self.assertIn('server-timing', headers)
+        # XFrameOptionsMiddleware is in MIDDLEWARE but not ASYNC_READ_MIDDLEWARE
+        self.assertNotIn('x-frame-options', headers)
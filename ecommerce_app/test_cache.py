@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from .cache import ReadThroughCache
+
+
+class ReadThroughCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.cache = ReadThroughCache('test')
+        self.cache.cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        time.sleep(0.2)
+        return {'value': self.calls}
+
+    def test_hit_after_miss(self):
+        key = self.cache.make_key('a')
+        self.assertEqual(self.cache.get_or_compute(key, self.compute), {'value': 1})
+        self.assertEqual(self.cache.get_or_compute(key, self.compute), {'value': 1})
+        self.assertEqual(self.cache.get_stats()['hits'], 1)
+        self.assertEqual(self.cache.get_stats()['misses'], 1)
+
+    def test_invalidate_moves_to_new_key(self):
+        key = self.cache.make_key('a')
+        self.cache.invalidate()
+        self.assertNotEqual(self.cache.make_key('a'), key)
+
+    def test_single_flight(self):
+        key = self.cache.make_key('a')
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.cache.get_or_compute(key, self.compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{'value': 1}] * 8)
+
+    async def test_async_single_flight(self):
+        async def compute():
+            self.calls += 1
+            await asyncio.sleep(0.2)
+            return {'value': self.calls}
+
+        key = await self.cache.amake_key('a')
+        self.assertEqual(key, self.cache.make_key('a'))
+        results = await asyncio.gather(*(self.cache.aget_or_compute(key, compute) for _ in range(8)))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{'value': 1}] * 8)
@@ -0,0 +1,62 @@
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from .customers import get_request_customer
+from .middleware import CustomerMiddleware
+from .models import Customer
+
+
+class RequestCustomerTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='buyer', password='buyer123')
+        self.customer = Customer.objects.get(user=self.user)
+
+    def make_request(self, user=None):
+        request = self.factory.get('/')
+        request.user = user or self.user
+        return request
+
+    def test_resolved_once_per_request(self):
+        request = self.make_request()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_request_customer(request), self.customer)
+            self.assertEqual(get_request_customer(request), self.customer)
+
+    def test_cached_across_requests(self):
+        get_request_customer(self.make_request())
+        with self.assertNumQueries(0):
+            self.assertEqual(get_request_customer(self.make_request()), self.customer)
+
+    def test_writes_invalidate_the_cache(self):
+        get_request_customer(self.make_request())
+        self.customer.phone = '555-0100'
+        self.customer.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_request_customer(self.make_request()).phone, '555-0100')
+
+        # Deleting the profile deletes the user as well, the cached customer goes with it
+        self.customer.delete()
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_request_customer(self.make_request()))
+
+    def test_anonymous_user_has_no_customer(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_request_customer(self.make_request(AnonymousUser())))
+
+    def test_result_follows_the_user(self):
+        request = self.make_request(AnonymousUser())
+        self.assertIsNone(get_request_customer(request))
+        # e.g. DRF authenticating the request after a middleware looked at it
+        request.user = self.user
+        self.assertEqual(get_request_customer(request), self.customer)
+
+    def test_middleware_adds_lazy_attribute(self):
+        request = self.make_request()
+        with self.assertNumQueries(0):
+            CustomerMiddleware(lambda request: None)(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(request.customer.id, self.customer.id)
+            self.assertEqual(request.customer.phone, self.customer.phone)
@@ -0,0 +1,170 @@
+import itertools
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .inventory import commit_cart, hold_stock, release_expired
+from .models import Cart, CartItem, Product, StockReservation
+from .reaper import reap_carts
+from .serializers import CreateOrderSerializer, ProductSerializer
+
+
+class StockReservationTestCase(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(title='Product A', unit_price=9.99, inventory=5)
+        self.cart = Cart.objects.create()
+        self.other_cart = Cart.objects.create()
+
+    def reserved(self):
+        return Product.objects.get(pk=self.product.pk).reserved
+
+    def test_hold_blocks_other_carts(self):
+        hold_stock(self.cart.id, self.product.id, 4)
+        self.assertEqual(self.reserved(), 4)
+        with self.assertRaises(ValidationError):
+            hold_stock(self.other_cart.id, self.product.id, 2)
+        hold_stock(self.other_cart.id, self.product.id, 1)
+        self.assertEqual(self.reserved(), 5)
+
+    def test_hold_adjusts_to_new_quantity(self):
+        hold_stock(self.cart.id, self.product.id, 4)
+        hold_stock(self.cart.id, self.product.id, 2)
+        self.assertEqual(self.reserved(), 2)
+        hold_stock(self.cart.id, self.product.id, 0)
+        self.assertEqual(self.reserved(), 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_hold_is_reclaimed(self):
+        hold_stock(self.cart.id, self.product.id, 5)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        hold_stock(self.other_cart.id, self.product.id, 3)
+        self.assertEqual(self.reserved(), 3)
+        self.assertFalse(StockReservation.objects.filter(cart=self.cart).exists())
+
+    def test_release_expired(self):
+        hold_stock(self.cart.id, self.product.id, 2)
+        hold_stock(self.other_cart.id, self.product.id, 1)
+        StockReservation.objects.filter(cart=self.cart).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(release_expired(), 1)
+        self.assertEqual(self.reserved(), 1)
+
+    def test_deleting_cart_releases_stock(self):
+        hold_stock(self.cart.id, self.product.id, 3)
+        self.cart.delete()
+        self.assertEqual(self.reserved(), 0)
+
+    def test_commit_converts_reservation(self):
+        hold_stock(self.cart.id, self.product.id, 3)
+        hold_stock(self.other_cart.id, self.product.id, 2)
+        commit_cart(self.cart.id, {self.product.id: 3})
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.inventory, product.reserved), (2, 2))
+        with self.assertRaises(ValidationError):
+            commit_cart(Cart.objects.create().id, {self.product.id: 1})
+
+    def test_product_saves_keep_concurrent_holds(self):
+        # The product is loaded (by a PUT or an admin form) before a cart takes a hold
+        loaded = Product.objects.get(pk=self.product.pk)
+        hold_stock(self.cart.id, self.product.id, 4)
+        serializer = ProductSerializer(loaded, data={'title': 'Product A', 'unit_price': '9.99', 'inventory': 5})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(self.reserved(), 4)
+        with self.assertRaises(ValidationError):
+            hold_stock(self.other_cart.id, self.product.id, 2)
+
+        loaded.inventory_update(6)
+        self.assertEqual(self.reserved(), 4)
+
+
+
+class CartReaperTestCase(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(title='Product A', unit_price=9.99, inventory=10)
+        self.stale = [Cart.objects.create() for _ in range(5)]
+        self.fresh = Cart.objects.create()
+        for cart in self.stale + [self.fresh]:
+            CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+            hold_stock(cart.id, self.product.id, 1)
+        Cart.objects.filter(pk__in=[cart.pk for cart in self.stale]).update(updated_at=timezone.now() - timedelta(days=8))
+
+    def test_reaps_only_stale_carts(self):
+        report = reap_carts(timedelta(days=7), batch_size=2)
+        self.assertEqual(report['deleted'], 5)
+        self.assertEqual(report['batches'], 3)
+        self.assertEqual(list(Cart.objects.values_list('pk', flat=True)), [self.fresh.pk])
+        self.assertEqual(CartItem.objects.count(), 1)
+        self.assertEqual(StockReservation.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).reserved, 1)
+
+    def test_limit_bounds_a_run(self):
+        self.assertEqual(reap_carts(timedelta(days=7), batch_size=2, limit=3)['deleted'], 3)
+        self.assertEqual(Cart.objects.count(), 3)
+
+    def test_cart_changes_reset_idle_time(self):
+        cart = self.stale[0]
+        hold_stock(cart.id, self.product.id, 2)
+        Cart.objects.filter(pk=cart.pk).touch()
+        reap_carts(timedelta(days=7))
+        self.assertTrue(Cart.objects.filter(pk=cart.pk).exists())
+
+
+class OversellStressTestCase(TransactionTestCase):
+    buyers = 32
+    inventory = 10
+
+    def setUp(self):
+        self.product = Product.objects.create(title='Hot Product', unit_price=9.99, inventory=self.inventory)
+        self.user = User.objects.create_user(username='buyer', password='buyer123')
+
+    def retry(self, func, *args, **kwargs):
+        # SQLite answers lock contention with "database table is locked", a real client
+        # backs off and retries
+        for attempt in itertools.count():
+            try:
+                return func(*args, **kwargs)
+            except OperationalError:
+                time.sleep(random.uniform(0, min(0.2, 0.005 * 2 ** attempt)))
+
+    def buy(self, results):
+        try:
+            cart = self.retry(Cart.objects.create)
+            try:
+                self.retry(hold_stock, cart.id, self.product.id, 1)
+            except ValidationError:
+                results.append('out_of_stock')
+                return
+            self.retry(CartItem.objects.create, cart=cart, product=self.product, quantity=1)
+
+            def checkout():
+                serializer = CreateOrderSerializer(data={'cart_id': cart.id}, context={'user_id': self.user.id})
+                serializer.is_valid(raise_exception=True)
+                return serializer.save()
+
+            self.retry(checkout)
+            results.append('sold')
+        except Exception as e:
+            results.append(e)
+        finally:
+            connection.close()
+
+    def test_no_oversell_under_concurrency(self):
+        results = []
+        threads = [threading.Thread(target=self.buy, args=(results,)) for _ in range(self.buyers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual([r for r in results if r not in ('sold', 'out_of_stock')], [])
+        self.assertEqual(results.count('sold'), self.inventory)
+        self.assertEqual(product.inventory, 0)
+        self.assertEqual(product.reserved, 0)
@@ -0,0 +1,70 @@
+import re
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .metrics import LATENCY_BUCKETS, RequestMetrics, registry
+from .models import Product
+
+
+class PerformanceMetricsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        Product.objects.create(title='Product', unit_price='9.99', inventory=1)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/shop/products/')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        queries = int(re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', timing).group(1))
+        self.assertGreater(queries, 0)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+        # Served from the product cache the second time
+        response = self.client.get('/shop/products/')
+        self.assertIn('desc="0 queries"', response['Server-Timing'])
+
+    @override_settings(SERVER_TIMING=False)
+    def test_server_timing_can_be_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get('/shop/products/'))
+
+    def test_requests_are_aggregated_per_route(self):
+        self.client.get('/shop/products/')
+        self.client.get('/shop/products/')
+        self.client.get('/shop/products/0/')
+        self.client.get('/no-such-page/')
+
+        self.assertEqual(registry.requests[('products-list', 'GET', 200)], 2)
+        self.assertEqual(registry.requests[('products-detail', 'GET', 404)], 1)
+        self.assertEqual(registry.requests[('unmatched', 'GET', 404)], 1)
+        self.assertEqual(sum(registry.buckets[('products-list', 'GET')]), 2)
+        self.assertGreater(registry.totals[('products-list', 'GET')]['response_bytes'], 0)
+
+    def test_histogram_buckets(self):
+        registry.observe('route', 'GET', 200, RequestMetrics(), 0.005, 10)
+        registry.observe('route', 'GET', 200, RequestMetrics(), 0.3, 10)
+        registry.observe('route', 'GET', 200, RequestMetrics(), 60, 10)
+        text = registry.render()
+
+        self.assertIn('http_requests_total{route="route",method="GET",status="200"} 3', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="route",method="GET",le="0.005"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="route",method="GET",le="0.25"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="route",method="GET",le="0.5"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="route",method="GET",le="+Inf"} 3', text)
+        self.assertIn('http_request_duration_seconds_count{route="route",method="GET"} 3', text)
+        self.assertEqual(text.count('http_request_duration_seconds_bucket'), len(LATENCY_BUCKETS) + 1)
+
+    def test_metrics_endpoint(self):
+        self.client.get('/shop/products/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'http_requests_total{route="products-list",method="GET",status="200"} 1', response.content)
+        self.assertIn(b'product_cache_events_total', response.content)
+
+    def test_metrics_endpoint_is_restricted(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.8').status_code, 403)
+        with self.settings(METRICS_ALLOWED_IPS=['*']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.8').status_code, 200)
@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from decimal import Decimal
 from datetime import datetime
 from django.contrib.auth.models import User
@@ -6,6 +6,13 @@ from .models import Product, Customer, Order, OrderItem, Review, Cart, CartItem
 from datetime import date
 from uuid import uuid4
 from django.db.utils import IntegrityError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Q
+from unittest import skipUnless
+from django.test import override_settings
+from .ids import uuid7
+from .review_stats import rebuild_review_stats
 
 class ProductModelTestCase(TestCase):
     def setUp(self):
@@ -123,6 +130,24 @@ class CartModelTestCase(TestCase):
         self.assertTrue(str(self.cart.id), uuid4().hex)
         self.assertIsNotNone(self.cart.created_at)
 
+
+class CartIdTestCase(TestCase):
+    def test_uuid7_layout(self):
+        cart_id = uuid7()
+        self.assertEqual(cart_id.version, 7)
+        self.assertEqual(cart_id.variant, 'specified in RFC 4122')
+
+    def test_uuid7_is_time_ordered(self):
+        ids = [uuid7() for _ in range(1000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual([cart_id.hex for cart_id in ids], sorted(cart_id.hex for cart_id in ids))
+
+    def test_new_carts_use_configured_version(self):
+        self.assertEqual(Cart.objects.create().id.version, 7)
+        with override_settings(CART_ID_VERSION=4):
+            self.assertEqual(Cart.objects.create().id.version, 4)
+
+
 class CartItemModelTestCase(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='user_test', password='password_test')
@@ -180,4 +205,130 @@ class ReviewModelTestCase(TestCase):
                 product=self.product,
                 customer=self.customer,
                 description='Another test review'
-            )
\ No newline at end of file
+            )
+
+class ReviewStatsTestCase(TestCase):
+    def setUp(self):
+        self.products = [Product.objects.create(title=f'Product {i}', unit_price=Decimal('9.99'), inventory=1) for i in range(3)]
+        self.customers = [Customer.objects.get(user=User.objects.create_user(username=f'reviewer{i}')) for i in range(3)]
+
+    def review_counts(self):
+        return list(Product.objects.order_by('id').values_list('review_count', flat=True))
+
+    def test_counts_follow_reviews(self):
+        for customer in self.customers:
+            Review.objects.create(product=self.products[0], customer=customer, description='Fine')
+        Review.objects.create(product=self.products[1], customer=self.customers[0], description='Fine')
+        self.assertEqual(self.review_counts(), [3, 1, 0])
+
+        Review.objects.filter(customer=self.customers[1]).delete()
+        # Deleting a customer deletes its reviews through the cascade
+        self.customers[0].delete()
+        self.assertEqual(self.review_counts(), [1, 0, 0])
+
+    def test_backfill_rebuilds_counts_in_batches(self):
+        Review.objects.bulk_create([Review(product=product, customer=self.customers[0], description='Fine') for product in self.products[:2]])
+        Product.objects.filter(pk=self.products[2].pk).update(review_count=7)
+
+        report = rebuild_review_stats(batch_size=2)
+        self.assertEqual(self.review_counts(), [1, 1, 0])
+        self.assertEqual((report['products'], report['batches']), (3, 2))
+
+    def test_updates_leave_last_update_alone(self):
+        before = Product.objects.get(pk=self.products[0].pk).last_update
+        Review.objects.create(product=self.products[0], customer=self.customers[0], description='Fine')
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).last_update, before)
+
+    def test_product_saves_keep_concurrent_reviews(self):
+        product = Product.objects.get(pk=self.products[0].pk)
+        Review.objects.create(product=self.products[0], customer=self.customers[0], description='Fine')
+        product.title = 'Renamed'
+        product.save()
+        self.assertEqual(self.review_counts(), [1, 0, 0])
+
+class ReviewCountMigrationTestCase(TransactionTestCase):
+    before = [('ecommerce_app', '0017_cart_time_ordered_id')]
+    after = [('ecommerce_app', '0018_product_review_count')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_existing_reviews_are_counted(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        old_apps = executor.loader.project_state(self.before).apps
+        OldProduct = old_apps.get_model('ecommerce_app', 'Product')
+        OldCustomer = old_apps.get_model('ecommerce_app', 'Customer')
+        OldReview = old_apps.get_model('ecommerce_app', 'Review')
+        reviewed, other = [OldProduct.objects.create(title=f'Product {i}', unit_price=Decimal('9.99'), inventory=1) for i in range(2)]
+        for i in range(2):
+            customer = OldCustomer.objects.get(user_id=User.objects.create_user(username=f'reviewer{i}').pk)
+            OldReview.objects.create(product=reviewed, customer=customer, description='Fine')
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        NewProduct = executor.loader.project_state(self.after).apps.get_model('ecommerce_app', 'Product')
+        self.assertEqual(NewProduct.objects.get(pk=reviewed.pk).review_count, 2)
+        self.assertEqual(NewProduct.objects.get(pk=other.pk).review_count, 0)
+
+class ProductTitleConstraintTestCase(TestCase):
+    def test_duplicate_title_is_rejected_by_database(self):
+        Product.objects.create(title='Product A', unit_price=Decimal('9.99'), inventory=10)
+        with self.assertRaises(IntegrityError):
+            Product.objects.create(title='Product A', unit_price=Decimal('5.00'), inventory=1)
+
+
+class ProductTitleMigrationTestCase(TransactionTestCase):
+    before = [('ecommerce_app', '0012_product_reserved_stockreservation')]
+    after = [('ecommerce_app', '0013_hot_path_indexes')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_existing_duplicate_titles_are_renamed(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        OldProduct = executor.loader.project_state(self.before).apps.get_model('ecommerce_app', 'Product')
+        first, second, other = [
+            OldProduct.objects.create(title=title, unit_price=Decimal('5.00'), inventory=1)
+            for title in ['Lamp', 'Lamp', 'Desk']
+        ]
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        titles = dict(OldProduct.objects.values_list('id', 'title'))
+        self.assertEqual(titles, {first.id: 'Lamp', second.id: f'Lamp ({second.id})', other.id: 'Desk'})
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class HotQueryIndexTestCase(TestCase):
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {index}', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_reviews_of_product(self):
+        self.assertUsesIndex(Review.objects.filter(product_id=1).order_by('-date', '-id')[:20], 'review_product_date_idx')
+
+    def test_orders_of_customer(self):
+        self.assertUsesIndex(Order.objects.filter(customer__user_id=1).order_by('-placed_at', '-id')[:20], 'order_customer_placed_idx')
+
+    def test_orders_by_status(self):
+        self.assertUsesIndex(Order.objects.filter(status=Order.STATUS_PENDING).order_by('-placed_at', '-id')[:20], 'order_status_placed_idx')
+
+    def test_all_orders(self):
+        self.assertUsesIndex(Order.objects.order_by('-placed_at', '-id')[:20], 'order_placed_at_idx')
+
+    def test_product_listing_page(self):
+        position = Q(last_update__lt='2024-01-01T00:00:00+00:00') | Q(last_update='2024-01-01T00:00:00+00:00', id__lt=10)
+        self.assertUsesIndex(Product.objects.filter(position).order_by('-last_update', '-id')[:20], 'product_last_update_idx')
+
+    def test_product_listing_by_price(self):
+        self.assertUsesIndex(Product.objects.filter(unit_price__gte=10).order_by('unit_price', 'id')[:20], 'product_unit_price_idx')
+
+    def test_product_title_lookup(self):
+        plan = Product.objects.filter(title='Product A').explain()
+        self.assertIn('USING INDEX', plan)
+        self.assertNotIn('SCAN', plan)
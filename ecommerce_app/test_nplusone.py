@@ -0,0 +1,68 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import RequestFactory, TestCase, override_settings
+
+from .middleware import NPlusOneMiddleware
+from .models import Customer, Product, Review
+from .nplusone import NPlusOneError, QueryWatch, detect_n_plus_one, end_watch, start_watch
+from .serializers import ReviewSerializer
+from .views import ReviewViewSet
+
+
+class NPlusOneDetectorTestCase(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(title='Product', unit_price='9.99', inventory=1)
+        for number in range(3):
+            customer = Customer.objects.get(user=User.objects.create_user(username=f'reviewer{number}'))
+            Review.objects.create(product=self.product, customer=customer, description='Fine')
+
+    def test_lazy_relation_per_row_is_reported(self):
+        with self.assertRaises(NPlusOneError) as error:
+            with detect_n_plus_one():
+                ReviewSerializer(Review.objects.all(), many=True).data
+        message = str(error.exception)
+        self.assertIn('ReviewSerializer.username at ecommerce_app/serializers.py:', message)
+        self.assertIn('in get_username', message)
+        self.assertIn('3 similar queries', message)
+
+    def test_joined_relation_is_not_reported(self):
+        with detect_n_plus_one():
+            ReviewSerializer(Review.objects.select_related('customer__user'), many=True).data
+
+    def test_threshold(self):
+        with detect_n_plus_one(threshold=4):
+            ReviewSerializer(Review.objects.select_related('customer'), many=True).data
+
+    def test_in_lists_of_any_length_have_one_shape(self):
+        watch = QueryWatch(threshold=2)
+        watch.record('SELECT "id" FROM "product" WHERE "id" IN (%s, %s)')
+        watch.record('SELECT "id" FROM "product" WHERE "id" IN (%s)')
+        watch.record('UPDATE "product" SET "inventory" = %s WHERE "id" = %s')
+        self.assertEqual(len(watch.report()), 1)
+        self.assertEqual(watch.report()[0].shape, 'SELECT "id" FROM "product" WHERE "id" IN (...)')
+
+    def test_view_calls_are_counted_separately(self):
+        viewset = ReviewViewSet.as_view({'get': 'retrieve'})
+        review = Review.objects.first()
+        with detect_n_plus_one():
+            for _ in range(3):
+                response = viewset(RequestFactory().get('/'), product_pk=self.product.id, pk=review.id)
+                self.assertEqual(response.status_code, 200)
+
+    def test_findings_are_logged_in_warn_mode(self):
+        watch, token = start_watch(threshold=2)
+        with self.assertLogs('ecommerce_app.nplusone', 'WARNING') as logs:
+            ReviewSerializer(Review.objects.all(), many=True).data
+            findings = end_watch(watch, token)
+        # The customer and its user, both loaded per review
+        self.assertEqual(len(findings), 2)
+        self.assertIn('ReviewSerializer.username', logs.output[0])
+
+    @override_settings(NPLUSONE_DETECTION='off')
+    def test_middleware_is_off(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            NPlusOneMiddleware(lambda request: None)
+
+    @override_settings(NPLUSONE_DETECTION='raise')
+    def test_middleware_passes_clean_requests(self):
+        self.assertEqual(self.client.get(f'/shop/products/{self.product.id}/').status_code, 200)
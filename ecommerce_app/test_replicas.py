@@ -0,0 +1,77 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.db import router
+
+from auth_app.authentication import get_user_state
+
+from .cache import product_cache
+from .customers import get_customer
+from .middleware import ReplicaRoutingMiddleware
+from .models import Product
+from .replicas import PIN_COOKIE, use_replicas
+from .search import InvertedIndex
+
+
+@override_settings(REPLICA_DATABASES=['replica'], REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.read_from = []
+        self.middleware = ReplicaRoutingMiddleware(self.view)
+
+    def view(self, request):
+        self.read_from.append(router.db_for_read(Product))
+        return HttpResponse()
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(router.db_for_read(Product), 'default')
+        with use_replicas():
+            self.assertEqual(router.db_for_read(Product), 'replica')
+            self.assertEqual(router.db_for_write(Product), 'default')
+
+    def test_safe_requests_read_from_replica(self):
+        self.middleware(self.factory.get('/shop/products/'))
+        self.middleware(self.factory.post('/shop/carts/'))
+        self.assertEqual(self.read_from, ['replica', 'default'])
+
+    def test_writer_is_pinned_to_primary(self):
+        self.middleware(self.factory.post('/shop/orders/', HTTP_AUTHORIZATION='Bearer a'))
+        self.middleware(self.factory.get('/shop/orders/', HTTP_AUTHORIZATION='Bearer a'))
+        # Other clients behind the same address still read from the replicas
+        self.middleware(self.factory.get('/shop/orders/', HTTP_AUTHORIZATION='Bearer b'))
+        self.middleware(self.factory.get('/shop/products/'))
+        self.assertEqual(self.read_from, ['default', 'default', 'replica', 'replica'])
+
+    def test_writes_set_the_pin_cookie(self):
+        # A sign-up has no credentials yet, the cookie carries the pin to the login
+        response = self.middleware(self.factory.post('/auth/users/'))
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+        request = self.factory.post('/auth/jwt/create/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.middleware(request)
+        request = self.factory.get('/shop/customers/me/', HTTP_AUTHORIZATION='Bearer new')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.middleware(request)
+        self.assertEqual(self.read_from, ['default', 'default', 'default'])
+        self.assertNotIn(PIN_COOKIE, self.middleware(self.factory.get('/shop/products/')).cookies)
+
+    def test_pin_expires(self):
+        with override_settings(REPLICA_STICKY_SECONDS=0.05):
+            self.middleware(self.factory.post('/shop/carts/'))
+        time.sleep(0.1)
+        self.middleware(self.factory.get('/shop/products/'))
+        self.assertEqual(self.read_from, ['default', 'replica'])
+
+    def test_shared_caches_are_filled_from_primary(self):
+        # 'replica' isn't a configured database, a fill routed there would fail
+        user = User.objects.create_user(username='new')
+        with use_replicas():
+            self.assertEqual(product_cache.get_or_compute('replicas-test', lambda: router.db_for_read(Product)), 'default')
+            self.assertEqual(get_user_state(user.id)[-1], get_customer(user).id)
+            self.assertIsNone(get_user_state(user.id + 1))
+            self.assertEqual(InvertedIndex().search('anything'), [])
@@ -0,0 +1,120 @@
+from unittest import mock, skipUnless
+
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase
+
+from .models import Product
+from .search import FTS_TABLE, FTS_TRIGGERS, InvertedIndex, PostgresFTSBackend, SQLiteFTSBackend, get_search_backend, restore_search_triggers
+from .views import ProductViewSet
+
+
+class SearchTestCase(TestCase):
+    def setUp(self):
+        Product.objects.create(title='Red running shoes', description='Lightweight trainers', unit_price=50, inventory=5)
+        Product.objects.create(title='Blue socks', description='Soft socks for running', unit_price=5, inventory=5)
+        Product.objects.create(title='Green hat', description='Wool', unit_price=15, inventory=5)
+
+    def titles(self, backend, query, **kwargs):
+        ids = backend.search(query, **kwargs)
+        products = Product.objects.in_bulk(ids)
+        return [products[pk].title for pk in ids]
+
+    def assertBackendSearches(self, backend):
+        # Title matches rank above description matches
+        self.assertEqual(self.titles(backend, 'running'), ['Red running shoes', 'Blue socks'])
+        self.assertEqual(self.titles(backend, 'runn'), ['Red running shoes', 'Blue socks'])
+        self.assertEqual(self.titles(backend, 'running socks'), ['Blue socks'])
+        self.assertEqual(self.titles(backend, 'running', offset=1, limit=1), ['Blue socks'])
+        self.assertEqual(self.titles(backend, 'sandals'), [])
+        self.assertEqual(self.titles(backend, '"*:'), [])
+
+    def test_default_backend(self):
+        self.assertBackendSearches(get_search_backend())
+
+    def test_python_index(self):
+        self.assertBackendSearches(InvertedIndex())
+
+    def test_index_follows_writes(self):
+        for backend in (get_search_backend(), InvertedIndex()):
+            backend.search('warmup')
+            product = Product.objects.get(title='Green hat')
+            product.title = 'Green running cap'
+            product.save()
+            backend.index(product)
+            self.assertIn('Green running cap', self.titles(backend, 'running'))
+
+            pk = product.pk
+            product.delete()
+            backend.remove(pk)
+            self.assertNotIn('Green running cap', self.titles(backend, 'running'))
+            Product.objects.create(title='Green hat', description='Wool', unit_price=15, inventory=5)
+
+    def test_python_index_picks_up_writes_of_other_processes(self):
+        # Two indexes sharing the cache stand in for two worker processes
+        writer, reader = InvertedIndex(), InvertedIndex()
+        self.assertEqual(self.titles(reader, 'cap'), [])
+        writer.search('warmup')
+        product = Product.objects.get(title='Green hat')
+        product.title = 'Green running cap'
+        product.save()
+        writer.index(product)
+        self.assertEqual(self.titles(writer, 'cap'), ['Green running cap'])
+        self.assertEqual(self.titles(reader, 'cap'), ['Green running cap'])
+
+    def test_signals_index_on_commit_only(self):
+        index = InvertedIndex()
+        index.search('warmup')
+        with mock.patch('ecommerce_app.search._backend', index):
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        Product.objects.create(title='Rolled back cap', unit_price=5, inventory=1)
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+            self.assertEqual(self.titles(index, 'cap'), [])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Product.objects.create(title='Committed cap', unit_price=5, inventory=1)
+            self.assertEqual(self.titles(index, 'cap'), ['Committed cap'])
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 triggers')
+    def test_triggers_exist_after_migrations(self):
+        # Migrations that rebuild the product table on SQLite drop them
+        if FTS_TABLE not in connection.introspection.table_names():
+            self.skipTest('SQLite build without FTS5')
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'ecommerce_app_product'")
+            self.assertTrue(set(FTS_TRIGGERS) <= {name for (name,) in cursor.fetchall()})
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 triggers')
+    def test_missing_triggers_are_restored(self):
+        if FTS_TABLE not in connection.introspection.table_names():
+            self.skipTest('SQLite build without FTS5')
+        with connection.cursor() as cursor:
+            for name in FTS_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER {name}')
+        Product.objects.create(title='Missed cap', unit_price=5, inventory=1)
+        backend = SQLiteFTSBackend()
+        self.assertEqual(self.titles(backend, 'cap'), [])
+
+        restore_search_triggers()
+        self.assertEqual(self.titles(backend, 'cap'), ['Missed cap'])
+        Product.objects.create(title='Indexed cap', unit_price=5, inventory=1)
+        self.assertEqual(sorted(self.titles(backend, 'cap')), ['Indexed cap', 'Missed cap'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL full text search')
+    def test_postgres_backend(self):
+        self.assertBackendSearches(PostgresFTSBackend())
+
+    def test_search_endpoint(self):
+        viewset = ProductViewSet.as_view({'get': 'list'})
+        factory = RequestFactory()
+        response = viewset(factory.get('/products/?q=running&page_size=1'))
+        self.assertEqual([product['title'] for product in response.data['results']], ['Red running shoes'])
+        self.assertIsNone(response.data['previous'])
+
+        response = viewset(factory.get(response.data['next']))
+        self.assertEqual([product['title'] for product in response.data['results']], ['Blue socks'])
+        self.assertIsNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
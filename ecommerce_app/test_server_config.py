@@ -0,0 +1,42 @@
+import os
+import runpy
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+CONFIG = os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+
+
+class ServerConfigTestCase(SimpleTestCase):
+    def load(self, cpus=2, **environ):
+        real_open = open
+
+        def no_cgroup_quota(path, *args, **kwargs):
+            if path == '/sys/fs/cgroup/cpu.max':
+                raise OSError(path)
+            return real_open(path, *args, **kwargs)
+
+        with mock.patch.dict(os.environ, environ), mock.patch('os.sched_getaffinity', return_value=set(range(cpus))), \
+                mock.patch('builtins.open', no_cgroup_quota):
+            return runpy.run_path(CONFIG)
+
+    def test_wsgi_workers_follow_cpus(self):
+        config = self.load(cpus=4, CACHE_URL='redis://redis:6379/1')
+        self.assertEqual((config['wsgi_app'], config['worker_class']), ('ecommerce.wsgi:application', 'gthread'))
+        self.assertEqual((config['workers'], config['threads']), (9, 4))
+        self.assertTrue(config['preload_app'])
+
+    def test_asgi_mode(self):
+        config = self.load(cpus=4, SERVER_MODE='asgi', CACHE_URL='redis://redis:6379/1')
+        self.assertEqual((config['wsgi_app'], config['worker_class']), ('ecommerce.asgi:application', 'uvicorn.workers.UvicornWorker'))
+        self.assertEqual(config['workers'], 4)
+
+    def test_single_worker_without_shared_cache(self):
+        for environ in ({}, {'CACHE_URL': 'locmemcache://ecommerce'}, {'SERVER_MODE': 'asgi'}):
+            with self.subTest(**environ):
+                self.assertEqual(self.load(cpus=4, **environ)['workers'], 1)
+
+    def test_environment_overrides(self):
+        config = self.load(WEB_CONCURRENCY='3', WEB_THREADS='8', BIND='127.0.0.1:9000')
+        self.assertEqual((config['workers'], config['threads'], config['bind']), (3, 8, '127.0.0.1:9000'))
@@ -1,11 +1,21 @@
+import json
+from base64 import b64encode
+from urllib.parse import parse_qs, urlparse
+from decimal import Decimal
 from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth.models import User
 from rest_framework.test import force_authenticate
 from .views import ProductViewSet, CustomerViewSetAPI, ReviewViewSet, CartViewSet, CartItemViewSet, OrderViewSet
-from .models import Product, Customer, Review, Cart, CartItem, Order
+from .models import Product, Customer, Review, Cart, CartItem, Order, OrderItem
 from rest_framework import status
+from .nplusone import detect_n_plus_one
+from .customers import forget_customer
 
 
+@detect_n_plus_one()
 class ProductViewSetTestCase(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
@@ -24,6 +34,17 @@ class ProductViewSetTestCase(TestCase):
         response = self.viewset(request)
         self.assertEqual(response.status_code, 200)
 
+    def test_list_includes_review_counts(self):
+        users = [User.objects.create_user(username=f'reviewer{i}') for i in range(3)]
+        for customer in Customer.objects.filter(user__in=users):
+            Review.objects.create(product=self.product, customer=customer, description='Fine')
+        request = self.factory.get('/products/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.viewset(request)
+        self.assertEqual(response.data['results'][0]['review_count'], 3)
+        # Counts are read from the product rows, not the reviews
+        self.assertFalse(any('ecommerce_app_review' in query['sql'] for query in queries))
+
     def test_create_product(self):
         request = self.factory.post('/products/', {
             'title': 'New Product',
@@ -35,6 +56,17 @@ class ProductViewSetTestCase(TestCase):
         response = self.viewset(request)
         self.assertEqual(response.status_code, 201)
 
+    def test_create_duplicate_product(self):
+        request = self.factory.post('/products/', {
+            'title': 'Product A',
+            'unit_price': 19.99,
+            'inventory': 5
+        })
+        force_authenticate(request, user=self.user)
+        response = self.viewset(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Product.objects.filter(title='Product A').count(), 1)
+
     def test_retrieve_product(self):
         request = self.factory.get(f'/products/{self.product.id}/')
         force_authenticate(request, user=self.user)
@@ -59,8 +91,58 @@ class ProductViewSetTestCase(TestCase):
         self.assertEqual(response.status_code, 204)
 
 
-
-
+@detect_n_plus_one()
+class ProductPaginationTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.viewset = ProductViewSet.as_view({'get': 'list'})
+        for i in range(7):
+            Product.objects.create(title=f'Product {i}', unit_price=9.99, inventory=10)
+
+    def walk(self, url, key):
+        ids = []
+        while url:
+            response = self.viewset(self.factory.get(url))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(product['id'] for product in response.data['results'])
+            url = response.data[key]
+        return ids
+
+    def test_pages_cover_catalog_once(self):
+        ids = self.walk('/products/?page_size=3', 'next')
+        expected = list(Product.objects.order_by('-last_update', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_page_is_stable_across_inserts(self):
+        first = self.viewset(self.factory.get('/products/?page_size=3'))
+        Product.objects.create(title='Newest Product', unit_price=9.99, inventory=10)
+        second = self.viewset(self.factory.get(first.data['next']))
+        seen = [product['id'] for product in first.data['results'] + second.data['results']]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(second.data['results']), 3)
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.viewset(self.factory.get('/products/?page_size=3'))
+        second = self.viewset(self.factory.get(first.data['next']))
+        back = self.viewset(self.factory.get(second.data['previous']))
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(first.data['previous'])
+
+    def test_invalid_cursor(self):
+        response = self.viewset(self.factory.get('/products/?cursor=not-a-cursor'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_with_malformed_values(self):
+        # Well formed tokens whose values don't fit the (last_update, id) ordering
+        for position in (['notadate', 1], [{}, 1], [None, None], ['2020-01-01T00:00:00', 'x'], ['2020-01-01T00:00:00', [1]]):
+            cursor = b64encode(json.dumps({'p': position, 'r': 0, 'o': '-last_update,-id'}).encode()).decode()
+            response = self.viewset(self.factory.get('/products/', {'cursor': cursor}))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
+            self.assertEqual(response.data['detail'], 'Invalid cursor')
+
+
+
+@detect_n_plus_one()
 class CustomerViewSetAPITestCase(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
@@ -93,6 +175,7 @@ class CustomerViewSetAPITestCase(TestCase):
 
 
 
+@detect_n_plus_one()
 class ReviewViewSetTestCase(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
@@ -116,8 +199,20 @@ class ReviewViewSetTestCase(TestCase):
         force_authenticate(request, user=self.user)
         response = self.viewset(request, product_pk=self.product.id)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['description'], 'Great product!')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['description'], 'Great product!')
+
+    def test_list_reviews_loads_usernames_with_the_page(self):
+        users = [User.objects.create_user(username=f'reviewer{i}') for i in range(5)]
+        for customer in Customer.objects.filter(user__in=users):
+            Review.objects.create(product=self.product, customer=customer, description='Fine')
+        forget_customer(self.user.id)
+        request = self.factory.get(f'/products/{self.product.id}/reviews/')
+        force_authenticate(request, user=self.user)
+        # The requesting customer and one page query, whatever the page size
+        with self.assertNumQueries(2):
+            response = self.viewset(request, product_pk=self.product.id)
+        self.assertEqual({review['username'] for review in response.data['results']}, {user.username for user in users})
 
     def test_create_review(self):
         request = self.factory.post(f'/products/{self.product.id}/reviews/', {
@@ -138,7 +233,7 @@ class ReviewViewSetTestCase(TestCase):
         force_authenticate(request, user=self.user)
         response = self.viewset(request, product_pk=self.product.id, pk=review.id)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual((response.data[0]['description']), 'Great product!')
+        self.assertEqual((response.data['results'][0]['description']), 'Great product!')
 
 
     def test_update_review(self):
@@ -170,6 +265,7 @@ class ReviewViewSetTestCase(TestCase):
 
 
 
+@detect_n_plus_one()
 class CartViewSetTestCase(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
@@ -196,6 +292,7 @@ class CartViewSetTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
 
+@detect_n_plus_one()
 class CartItemViewSetTestCase(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
@@ -243,6 +340,7 @@ class CartItemViewSetTestCase(TestCase):
         response = self.viewset(request,  cart_pk=self.cart.id, pk=self.cart_item.id)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+@detect_n_plus_one()
 class OrderViewSetTestCase(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
@@ -291,4 +389,372 @@ class OrderViewSetTestCase(TestCase):
         request = self.factory.delete(f'/orders/{self.order.id}/')
         force_authenticate(request, user=self.user)
         response = self.viewset(request, pk=self.order.id)
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+@detect_n_plus_one()
+class OrderQueryCountTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='buyer', password='buyer123')
+        self.customer = Customer.objects.get(user=self.user)
+        self.products = [
+            Product.objects.create(title=f'Product {i}', unit_price=9.99, inventory=10) for i in range(3)
+        ]
+
+    def place_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(customer=self.customer)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=1, unit_price=product.unit_price)
+                for product in self.products
+            ])
+        return order
+
+    def list_orders(self):
+        viewset = OrderViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/orders/')
+        force_authenticate(request, user=self.user)
+        return viewset(request)
+
+    def test_list_query_count_is_constant(self):
+        self.place_orders(2)
+        with self.assertNumQueries(3):
+            response = self.list_orders()
+        self.assertEqual(len(response.data['results']), 2)
+
+        self.place_orders(8)
+        with self.assertNumQueries(3):
+            response = self.list_orders()
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(len(response.data['results'][0]['items']), 3)
+
+    def test_retrieve_query_count(self):
+        order = self.place_orders(1)
+        viewset = OrderViewSet.as_view({'get': 'retrieve'})
+        request = self.factory.get(f'/orders/{order.id}/')
+        force_authenticate(request, user=self.user)
+        with self.assertNumQueries(3):
+            response = viewset(request, pk=order.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['items']), 3)
+
+
+@detect_n_plus_one()
+class CheckoutTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='buyer', password='buyer123')
+        self.viewset = OrderViewSet.as_view({'post': 'create'})
+
+    def fill_cart(self, lines, inventory=10, quantity=2):
+        cart = Cart.objects.create()
+        for i in range(lines):
+            product = Product.objects.create(title=f'Product {cart.id} {i}', unit_price=9.99, inventory=inventory)
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        return cart
+
+    def checkout(self, cart):
+        request = self.factory.post('/orders/', {'cart_id': cart.id})
+        force_authenticate(request, user=self.user)
+        return self.viewset(request)
+
+    def test_checkout_decrements_inventory(self):
+        cart = self.fill_cart(3)
+        response = self.checkout(cart)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['items']), 3)
+        self.assertEqual(set(Product.objects.values_list('inventory', flat=True)), {8})
+        self.assertFalse(Cart.objects.filter(pk=cart.id).exists())
+
+    def test_checkout_query_count_is_constant(self):
+        small, large = self.fill_cart(2), self.fill_cart(20)
+        with self.assertNumQueries(23):
+            self.checkout(small)
+        # The buyer's customer was cached by the first checkout, both look it up
+        forget_customer(self.user.id)
+        with self.assertNumQueries(23):
+            self.checkout(large)
+
+    def test_checkout_refuses_to_oversell(self):
+        cart = self.fill_cart(3)
+        short = cart.items.first().product
+        short.inventory = 1
+        short.save()
+
+        response = self.checkout(cart)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Product.objects.get(pk=short.pk).inventory, 1)
+        self.assertEqual(set(Product.objects.exclude(pk=short.pk).values_list('inventory', flat=True)), {10})
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(Cart.objects.filter(pk=cart.id).exists())
+
+
+@detect_n_plus_one()
+class ProductCacheTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.viewset = ProductViewSet.as_view({'get': 'list', 'put': 'update', 'delete': 'destroy'})
+        self.detail = ProductViewSet.as_view({'get': 'retrieve'})
+        self.product = Product.objects.create(title='Product A', unit_price=9.99, inventory=10)
+
+    def test_list_is_served_from_cache(self):
+        self.viewset(self.factory.get('/products/'))
+        with self.assertNumQueries(0):
+            response = self.viewset(self.factory.get('/products/'))
+        self.assertEqual(response.data['results'][0]['title'], 'Product A')
+
+    def test_retrieve_is_served_from_cache(self):
+        self.detail(self.factory.get(f'/products/{self.product.id}/'), pk=self.product.id)
+        with self.assertNumQueries(0):
+            response = self.detail(self.factory.get(f'/products/{self.product.id}/'), pk=self.product.id)
+        self.assertEqual(response.data['title'], 'Product A')
+
+    def test_update_invalidates_cache(self):
+        self.viewset(self.factory.get('/products/'))
+        request = self.factory.put(f'/products/{self.product.id}/', {
+            'title': 'Product B', 'unit_price': 9.99, 'inventory': 10
+        }, content_type='application/json')
+        force_authenticate(request, user=self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.viewset(request, pk=self.product.id)
+        response = self.viewset(self.factory.get('/products/'))
+        self.assertEqual(response.data['results'][0]['title'], 'Product B')
+
+    def test_delete_invalidates_cache(self):
+        self.detail(self.factory.get(f'/products/{self.product.id}/'), pk=self.product.id)
+        request = self.factory.delete(f'/products/{self.product.id}/')
+        force_authenticate(request, user=self.admin)
+        self.viewset(request, pk=self.product.id)
+        response = self.detail(self.factory.get(f'/products/{self.product.id}/'), pk=self.product.id)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cache_stats_are_admin_only(self):
+        viewset = ProductViewSet.as_view({'get': 'cache_stats'}, **ProductViewSet.cache_stats.kwargs)
+        request = self.factory.get('/products/cache-stats/')
+        force_authenticate(request, user=self.admin)
+        response = viewset(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('hits', response.data)
+        self.assertEqual(viewset(self.factory.get('/products/cache-stats/')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@detect_n_plus_one()
+class ProductBulkTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        Product.objects.create(title='Product A', unit_price=9.99, inventory=10)
+
+    def upload(self, name, content, encoding='utf-8'):
+        viewset = ProductViewSet.as_view({'post': 'bulk_import'}, **ProductViewSet.bulk_import.kwargs)
+        request = self.factory.post('/products/import/', {'file': SimpleUploadedFile(name, content.encode(encoding))})
+        force_authenticate(request, user=self.admin)
+        return viewset(request)
+
+    def export(self, query=''):
+        viewset = ProductViewSet.as_view({'get': 'bulk_export'}, **ProductViewSet.bulk_export.kwargs)
+        request = self.factory.get(f'/products/export/{query}')
+        force_authenticate(request, user=self.admin)
+        response = viewset(request)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_import_csv_upserts_on_title(self):
+        response = self.upload('products.csv', (
+            'title,description,unit_price,inventory\n'
+            'Product A,Updated,12.50,3\n'
+            'Product B,New,5.00,7\n'
+            'Product C,Bad price,abc,1\n'
+        ))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual([error['row'] for error in response.data['errors']], [3])
+        product = Product.objects.get(title='Product A')
+        self.assertEqual((product.description, product.inventory), ('Updated', 3))
+        self.assertFalse(Product.objects.filter(title='Product C').exists())
+
+    def test_import_ndjson_reports_bad_lines(self):
+        response = self.upload('products.ndjson', (
+            '{"title": "Product B", "unit_price": "5.00", "inventory": 7}\n'
+            'not json\n'
+            '{"title": "Product C", "unit_price": "6.00"}\n'
+        ))
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+        self.assertIn('inventory', response.data['errors'][1]['errors'])
+
+    def test_import_rejects_files_that_are_not_utf8(self):
+        rows = ''.join(f'Product {i},,9.99,1\n' for i in range(5)) + 'Café,,9.99,1\n'
+        for name, content in [
+            ('products.csv', 'title,description,unit_price,inventory\n' + rows),
+            ('products.ndjson', '{"title": "Product B", "unit_price": "5.00", "inventory": 7}\n{"title": "Café"}\n'),
+        ]:
+            response = self.upload(name, content, encoding='latin-1')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('file', response.data)
+        # Nothing before the bad bytes was imported
+        self.assertEqual(Product.objects.count(), 1)
+
+    def test_import_csv_reports_unparsable_rows(self):
+        response = self.upload('products.csv', (
+            'title,description,unit_price,inventory\n'
+            'Product B,New,5.00,7\n'
+            'Product C,"Bad\x00quote",5.00,7\n'
+            'Product D,New,5.00,7\n'
+        ))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2])
+
+    def test_import_query_count_does_not_grow_with_rows(self):
+        rows = ''.join(f'Product {i},,9.99,1\n' for i in range(200))
+        with self.assertNumQueries(5):
+            self.upload('products.csv', 'title,description,unit_price,inventory\n' + rows)
+        self.assertEqual(Product.objects.count(), 201)
+
+    def test_export_csv(self):
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(content.splitlines(), ['id,title,description,unit_price,inventory', f'{Product.objects.get().id},Product A,,9.99,10'])
+
+    def test_export_ndjson(self):
+        response, content = self.export('?file_format=ndjson')
+        self.assertEqual(json.loads(content.splitlines()[0])['title'], 'Product A')
+
+
+@detect_n_plus_one()
+class ProductFilterTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.viewset = ProductViewSet.as_view({'get': 'list'})
+        Product.objects.create(title='Cheap', unit_price=5, inventory=0)
+        Product.objects.create(title='Mid', unit_price=30, inventory=3)
+        Product.objects.create(title='Pricey', unit_price=150, inventory=1)
+
+    def titles(self, query):
+        response = self.viewset(self.factory.get(f'/products/{query}'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product['title'] for product in response.data['results']], response.data['facets']
+
+    def test_price_range_and_stock(self):
+        titles, _ = self.titles('?min_price=10&max_price=200')
+        self.assertEqual(sorted(titles), ['Mid', 'Pricey'])
+        titles, _ = self.titles('?in_stock=true&max_price=100')
+        self.assertEqual(titles, ['Mid'])
+
+    def test_sort_by_price_pages_with_cursor(self):
+        response = self.viewset(self.factory.get('/products/?ordering=-price&page_size=2'))
+        self.assertEqual([product['title'] for product in response.data['results']], ['Pricey', 'Mid'])
+        response = self.viewset(self.factory.get(response.data['next']))
+        self.assertEqual([product['title'] for product in response.data['results']], ['Cheap'])
+
+    def test_cursor_only_continues_its_own_ordering(self):
+        response = self.viewset(self.factory.get('/products/?ordering=price&page_size=2'))
+        cursor = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+        for ordering in ('recent', 'oldest', '-price'):
+            response = self.viewset(self.factory.get('/products/', {'ordering': ordering, 'page_size': 2, 'cursor': cursor}))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, ordering)
+
+    def test_updated_since(self):
+        titles, _ = self.titles('?updated_since=2999-01-01')
+        self.assertEqual(titles, [])
+
+    def test_facets_ignore_their_own_filter(self):
+        _, facets = self.titles('?in_stock=true')
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [0, 0, 1, 0, 1])
+        self.assertEqual(facets['stock'], {'in_stock': 2, 'out_of_stock': 1})
+
+    def test_facets_are_one_query_and_cached(self):
+        with self.assertNumQueries(2):
+            self.titles('?min_price=1')
+        with self.assertNumQueries(1):
+            self.titles('?min_price=1&ordering=price')
+
+    def test_invalid_parameters(self):
+        for query in ('?min_price=abc', '?updated_since=yesterday', '?ordering=name', '?max_price=nan'):
+            response = self.viewset(self.factory.get(f'/products/{query}'))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+
+@detect_n_plus_one()
+class CartTotalsTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.viewset = CartViewSet.as_view({'get': 'retrieve', 'post': 'create'})
+        self.cart = Cart.objects.create()
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=Product.objects.create(title=f'Product {i}', unit_price='9.99', inventory=10), quantity=3)
+            for i in range(100)
+        ])
+
+    def test_totals_are_computed_by_database(self):
+        with self.assertNumQueries(2):
+            response = self.viewset(self.factory.get(f'/carts/{self.cart.id}/'), pk=self.cart.id)
+        self.assertEqual(response.data['total_cart_price'], Decimal('2997.00'))
+        self.assertEqual(response.data['item_count'], 300)
+        self.assertEqual(response.data['items'][0]['price_in_total'], Decimal('29.97'))
+
+    def test_new_cart_totals(self):
+        response = self.viewset(self.factory.post('/carts/', {}))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['total_cart_price'], response.data['item_count']), (0, 0))
+
+
+@detect_n_plus_one()
+class CartItemBatchTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.viewset = CartItemViewSet.as_view({'post': 'batch'})
+        self.cart = Cart.objects.create()
+        self.products = [Product.objects.create(title=f'Product {i}', unit_price='5.00', inventory=10) for i in range(20)]
+        self.post(
+            [{'product_id': product.id, 'quantity': 2} for product in self.products[:2]]
+        )
+
+    def post(self, operations):
+        request = self.factory.post(f'/carts/{self.cart.id}/items/batch/', {'operations': operations}, content_type='application/json')
+        return self.viewset(request, cart_pk=self.cart.id)
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart=self.cart).values_list('product_id', 'quantity'))
+
+    def test_add_set_remove(self):
+        first, second, third = self.products[:3]
+        response = self.post([
+            {'op': 'add', 'product_id': first.id, 'quantity': 3},
+            {'op': 'remove', 'product_id': second.id},
+            {'op': 'set', 'product_id': third.id, 'quantity': 4},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.quantities(), {first.id: 5, third.id: 4})
+        self.assertEqual(response.data['item_count'], 9)
+        self.assertEqual(response.data['total_cart_price'], Decimal('45.00'))
+        self.assertEqual(
+            dict(Product.objects.filter(pk__in=[first.id, second.id, third.id]).values_list('pk', 'reserved')),
+            {first.id: 5, second.id: 0, third.id: 4},
+        )
+
+    def test_query_count_does_not_grow_with_batch(self):
+        with self.assertNumQueries(17):
+            response = self.post([{'product_id': product.id, 'quantity': 1} for product in self.products])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.quantities()), 20)
+
+    def test_unknown_product_rejects_batch(self):
+        response = self.post([{'product_id': self.products[2].id, 'quantity': 1}, {'product_id': 0, 'quantity': 1}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(self.quantities()), 2)
+
+    def test_short_stock_rolls_back_batch(self):
+        response = self.post([
+            {'product_id': self.products[2].id, 'quantity': 1},
+            {'op': 'set', 'product_id': self.products[0].id, 'quantity': 11},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.quantities(), {self.products[0].id: 2, self.products[1].id: 2})
+        self.assertEqual(Product.objects.get(pk=self.products[2].id).reserved, 0)
+
+    def test_add_requires_quantity(self):
+        response = self.post([{'product_id': self.products[2].id}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
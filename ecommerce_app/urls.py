@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework_nested import routers
 from . import views
 
@@ -14,4 +15,8 @@ products_router.register('reviews', views.ReviewViewSet,basename='product-review
 carts_router = routers.NestedDefaultRouter(router, 'carts', lookup='cart')
 carts_router.register('items', views.CartItemViewSet, basename='cart-items')
 
-urlpatterns  = router.urls + products_router.urls + carts_router.urls
\ No newline at end of file
+urlpatterns  = router.urls + products_router.urls + carts_router.urls
+
+if settings.ASYNC_READ_VIEWS:
+    from .async_urls import urlpatterns as async_urlpatterns
+    urlpatterns = async_urlpatterns + urlpatterns
@@ -1,17 +1,30 @@
 from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from rest_framework.mixins import CreateModelMixin, UpdateModelMixin, RetrieveModelMixin, DestroyModelMixin
 from rest_framework.viewsets import GenericViewSet
 from .models import Customer, Product, Review, Cart, CartItem, Order
 from .serializers import (CustomerSerializer, ProductSerializer, ReviewSerializer, CartSerializer, CartItemSerializer, 
-AddCartItemSerializer, UpdateCartItemSerializer, OrderSerializer, CreateOrderSerializer, UpdateOrderSerializer)
+AddCartItemSerializer, UpdateCartItemSerializer, BatchCartItemSerializer, OrderSerializer, CreateOrderSerializer, UpdateOrderSerializer)
 from .permissions import IsAdminOrReadOnly, ReviewOwnerOrAdminOrReadOnly
+from .pagination import ProductPagination, OrderPagination, ReviewPagination
 from rest_framework.decorators import action
+from rest_framework.utils.urls import replace_query_param, remove_query_param
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.viewsets import ModelViewSet
 from rest_framework import status
 from rest_framework.permissions import BasePermission, IsAdminUser
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Prefetch
+from .inventory import hold_stock
+from .cache import product_cache
+from .search import get_search_backend
+from .filters import ProductFilterBackend, FILTER_PARAMS
+from .bulk import import_products, read_csv, read_ndjson, export_csv, export_ndjson
+from .metrics import registry
+from .customers import get_request_customer
 # Create your views here.
 
 
@@ -27,7 +40,74 @@ class ProductViewSet(ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = ProductPagination
+    filter_backends = [ProductFilterBackend]
     lookup_field = 'pk'
+
+    # Catalog reads go through the product cache, which is invalidated whenever a product is written.
+    # Stock figures changed by checkout (a queryset update) may lag by up to the cache timeout
+    def list(self, request, *args, **kwargs):
+        key = product_cache.make_key('list', request.build_absolute_uri())
+        if request.query_params.get('q'):
+            return Response(product_cache.get_or_compute(key, lambda: self.search(request)))
+        data = product_cache.get_or_compute(key, lambda: super(ProductViewSet, self).list(request, *args, **kwargs).data)
+
+        # Facet counts only depend on the filters, so paging and re-sorting reuse them
+        filters = sorted((name, request.query_params[name]) for name in FILTER_PARAMS if name in request.query_params)
+        facets_key = product_cache.make_key('facets', filters)
+        facets = product_cache.get_or_compute(facets_key, lambda: ProductFilterBackend().get_facets(request, self.get_queryset()))
+        return Response({**data, 'facets': facets})
+
+    # Full-text search over title and description, ranked by relevance and paged with ?page=
+    def search(self, request):
+        page_size = self.paginator.get_page_size(request)
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+
+        ids = get_search_backend().search(request.query_params['q'], offset=(page - 1) * page_size, limit=page_size + 1)
+        products = Product.objects.in_bulk(ids[:page_size])
+        serializer = self.get_serializer([products[pk] for pk in ids[:page_size] if pk in products], many=True)
+
+        url = request.build_absolute_uri()
+        return {
+            'next': replace_query_param(url, 'page', page + 1) if len(ids) > page_size else None,
+            'previous': (replace_query_param(url, 'page', page - 1) if page > 2 else remove_query_param(url, 'page')) if page > 1 else None,
+            'results': serializer.data,
+        }
+
+    def retrieve(self, request, *args, **kwargs):
+        key = product_cache.make_key('detail', request.build_absolute_uri())
+        return Response(product_cache.get_or_compute(key, lambda: super(ProductViewSet, self).retrieve(request, *args, **kwargs).data))
+
+    # Bulk load of a CSV (with a header line) or NDJSON file sent as the `file` form field.
+    # Products are upserted on title and invalid rows are reported without aborting the load
+    @action(detail=False, methods=['POST'], permission_classes=[IsAdminUser], url_path='import')
+    def bulk_import(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = request.data.get('file_format') or ('ndjson' if upload.name.endswith(('.ndjson', '.jsonl')) else 'csv')
+        if file_format not in ('csv', 'ndjson'):
+            return Response({'file_format': ['Expected csv or ndjson.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = read_csv(upload) if file_format == 'csv' else read_ndjson(upload)
+        return Response(import_products(rows))
+
+    # The whole catalog streamed in primary key order, the response never holds more than one chunk of rows
+    @action(detail=False, methods=['GET'], permission_classes=[IsAdminUser], url_path='export')
+    def bulk_export(self, request):
+        if request.query_params.get('file_format') == 'ndjson':
+            return StreamingHttpResponse(export_ndjson(), content_type='application/x-ndjson')
+        response = StreamingHttpResponse(export_csv(), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="products.csv"'
+        return response
+
+    @action(detail=False, methods=['GET'], permission_classes=[IsAdminUser], url_path='cache-stats')
+    def cache_stats(self, request):
+        return Response(product_cache.get_stats())
    
 
 class CustomerViewSetAPI(GenericViewSet):
@@ -38,7 +118,9 @@ class CustomerViewSetAPI(GenericViewSet):
 
     @action(detail=False, methods=['GET','PUT','DELETE'], permission_classes=[IsAuthenticated])
     def me(self,request):
-        (customer,created) = Customer.objects.get_or_create(user_id=request.user.id)
+        customer = get_request_customer(request)
+        if customer is None:
+            (customer,created) = Customer.objects.get_or_create(user_id=request.user.id)
         if request.method == 'GET':
             serializer = CustomerSerializer(customer)
             return Response(serializer.data)
@@ -63,19 +145,17 @@ class ReviewViewSet(ModelViewSet):
     """
     serializer_class = ReviewSerializer
     permission_classes = [ReviewOwnerOrAdminOrReadOnly]
+    pagination_class = ReviewPagination
     
 
     def get_queryset(self):
-
-        return Review.objects.filter(product_id=self.kwargs['product_pk'])
+        # The username of every review comes with the page, not one query per row
+        return Review.objects.filter(product_id=self.kwargs['product_pk']).select_related('customer__user')
     
 
     def get_serializer_context(self):
-        try:
-            customer = Customer.objects.get(user_id=self.request.user.id)
-        except:
-            return {'product_id': self.kwargs['product_pk'], 'customer_id':0}
-        return {'product_id': self.kwargs['product_pk'], 'customer_id':customer.id}
+        customer = get_request_customer(self.request)
+        return {'product_id': self.kwargs['product_pk'], 'customer_id': customer.id if customer else 0}
     
 class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
     """
@@ -83,7 +163,9 @@ class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, Gener
     
     """
 
-    queryset = Cart.objects.prefetch_related('items__product').all()
+    queryset = Cart.objects.with_totals().prefetch_related(
+        Prefetch('items', queryset=CartItem.objects.with_price().select_related('product'))
+    )
     serializer_class = CartSerializer
 
 class CartItemViewSet(ModelViewSet):
@@ -91,9 +173,11 @@ class CartItemViewSet(ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete']
 
     def get_queryset(self):
-        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('product')
+        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('product').with_price()
     
     def get_serializer_class(self):
+        if self.action == 'batch':
+            return BatchCartItemSerializer
         if self.request.method == 'POST':
             return AddCartItemSerializer
         elif self.request.method == 'PATCH':
@@ -102,6 +186,26 @@ class CartItemViewSet(ModelViewSet):
     
     def get_serializer_context(self):
         return {'cart_id': self.kwargs['cart_pk']}
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            hold_stock(instance.cart_id, instance.product_id, 0)
+            instance.delete()
+            Cart.objects.filter(pk=instance.cart_id).touch()
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request, *args, **kwargs):
+        """
+        Add, set or remove several products at once:
+        {"operations": [{"op": "add", "product_id": 1, "quantity": 2}, ...]}
+        and return the updated cart.
+
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart_id = serializer.save()
+        cart = CartViewSet.queryset.get(pk=cart_id)
+        return Response(CartSerializer(cart).data)
     
 class OrderViewSet(ModelViewSet):
     """
@@ -111,6 +215,7 @@ class OrderViewSet(ModelViewSet):
     """
     
     http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
+    pagination_class = OrderPagination
 
     def get_permissions(self):
         if self.request.method in ['PATCH', 'DELETE']:
@@ -120,9 +225,11 @@ class OrderViewSet(ModelViewSet):
     # Here CreateModelMixin (ModelViewSet inherits CreateModelMixin alongside other mixins) is overwritten by custom create method 
     # in order to generate a proper response to be sent to the client end
     def create(self, request, *args, **kwargs):
-        serializer = CreateOrderSerializer(data=request.data,context={'user_id': self.request.user.id})
+        customer = get_request_customer(request)
+        serializer = CreateOrderSerializer(data=request.data,context={'user_id': self.request.user.id, 'customer_id': customer.id if customer else None})
         serializer.is_valid(raise_exception=True)
         order = serializer.save()
+        order = Order.objects.prefetch_related('items__product').get(pk=order.pk)
         serializer = OrderSerializer(order)
         return Response(serializer.data)
 
@@ -148,8 +255,26 @@ class OrderViewSet(ModelViewSet):
     def get_queryset(self):
         user = self.request.user
 
+        # Items and their products are loaded in two extra queries for the whole page
+        # instead of one query per order and one per order item
+        queryset = Order.objects.prefetch_related('items__product')
+
         if user.is_staff:
-            return Order.objects.all()
+            return queryset
+
+        # Token authenticated users carry their customer id, the others are matched with a join
+        customer_id = getattr(user, 'customer_id', None)
+        if customer_id is not None:
+            return queryset.filter(customer_id=customer_id)
+        return queryset.filter(customer__user_id=user.id)
+
 
-        customer_id = Customer.objects.only('id').get(user_id=user.id)
-        return Order.objects.filter(customer_id=customer_id)
\ No newline at end of file
+def metrics(request):
+    """
+    Request metrics of this process in the Prometheus text format.
+
+    """
+    allowed = settings.METRICS_ALLOWED_IPS
+    if '*' not in allowed and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,9 @@
+#!/bin/sh
+# Production start: apply pending migrations (never generate them) and exec the pre-fork server
+set -e
+
+if [ "${RUN_MIGRATIONS:-1}" = "1" ]; then
+    python manage.py migrate --noinput
+fi
+
+exec gunicorn --config gunicorn.conf.py
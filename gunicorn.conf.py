@@ -0,0 +1,82 @@
+"""
+Production server settings, read by `gunicorn` from the project root
+(see entrypoint.sh). Everything can be overridden from the environment:
+
+    SERVER_MODE      wsgi (threaded workers, default) or asgi (uvicorn workers)
+    BIND             address to listen on, default 0.0.0.0:8000
+    WEB_CONCURRENCY  worker processes, default derived from the CPUs available
+                     (one without a shared CACHE_URL, see below)
+    WEB_THREADS      threads per WSGI worker, default 4
+
+The app is imported once in the master before forking (preload_app), so
+workers share its memory copy-on-write and start instantly. `kill -HUP`
+replaces the workers gracefully; as preloaded code lives in the master,
+deploying new code takes `kill -USR2` (start a new master) followed by
+`kill -TERM` of the old one once the new workers are up.
+
+"""
+import math
+import os
+
+
+def available_cpus():
+    """
+    CPUs this process may actually use: its affinity mask, capped by a
+    cgroup v2 CPU quota (docker --cpus) when there is one.
+
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+server_mode = os.environ.get('SERVER_MODE', 'wsgi')
+cpus = available_cpus()
+
+# Cache invalidations only reach every worker through a shared cache (CACHE_URL),
+# with the per process default cache the app has to run in a single worker
+shared_cache = not os.environ.get('CACHE_URL', 'locmemcache://').startswith('locmemcache:')
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+if server_mode == 'asgi':
+    # One event loop per CPU, each handles many connections on its own
+    wsgi_app = 'ecommerce.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpus if shared_cache else 1))
+else:
+    # The usual 2 x CPUs + 1 processes, threads cover time spent waiting on the database.
+    # Each thread keeps one persistent database connection (see DB_CONN_MAX_AGE)
+    wsgi_app = 'ecommerce.wsgi:application'
+    worker_class = 'gthread'
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpus * 2 + 1 if shared_cache else 1))
+    threads = int(os.environ.get('WEB_THREADS', 4))
+
+preload_app = True
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to cap slow memory growth, staggered so they don't all restart together
+max_requests = 2000
+max_requests_jitter = 200
+
+# Worker heartbeats on tmpfs, overlay filesystems in containers can stall them
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = '-'
+errorlog = '-'
+
+
+def pre_fork(server, worker):
+    # Connections opened while preloading (system checks, AppConfig.ready) must not be shared by the workers
+    from django.db import connections
+    connections.close_all()